@@ -0,0 +1,58 @@
+import os
+
+
+class AtomicWriter:
+    """
+    Output file which is opened only once and written in large batches. Lines go to a temporary
+    file next to the target, which replaces the target only when everything is written,
+    so an interrupted run never leaves a half-written file.
+
+    Usage:
+        with AtomicWriter(path) as f_out:
+            f_out.write(line)
+    """
+    def __init__(self, path, batch_size=1 << 20):
+        self.path = path
+        self.tmp_path = path + '.tmp'
+        self.batch_size = batch_size
+        self.batch = []
+        self.batch_length = 0
+        self.file = None
+
+    def __enter__(self):
+        self.file = open(self.tmp_path, 'w', encoding='utf-8', buffering=self.batch_size)
+        return self
+
+    def write(self, text):
+        """
+        Adds text to the current batch; the batch is written when it's large enough.
+
+        Args:
+            text (str) — text to be written
+        """
+        self.batch.append(text)
+        self.batch_length += len(text)
+        if self.batch_length >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the current batch to the temporary file.
+        """
+        self.file.write(''.join(self.batch))
+        self.batch = []
+        self.batch_length = 0
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                self.flush()
+                self.file.flush()
+                os.fsync(self.file.fileno())
+        finally:
+            self.file.close()
+        if exc_type is None:
+            os.replace(self.tmp_path, self.path)
+        else:
+            os.remove(self.tmp_path)
+        return False
@@ -1,7 +1,14 @@
+import argparse
 from datetime import datetime
-from pymorphy2 import MorphAnalyzer
+from multiprocessing import Pool
 import os
 import re
+import sys
+from token_record import Token
+from tokens_index import load_tokens_index, read_document
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from morph_cache import morph_cache
+from nlc_records import parse_record
 
 
 def read_info(file_path, header):
@@ -24,30 +31,6 @@ def read_info(file_path, header):
     return data
 
 
-def find_feature_value(feature, feature_list):
-    """
-    Finds a value of a given feature.
-
-    Args:
-        feature (str) — feature we're interested in
-        feature_list (list of strs) — list of strs which may contain the feature
-
-    Returns:
-         value (str) — value of the feature (if feature is present) or '0'
-    """
-    found = False
-    i = 0
-    while not found and i < len(feature_list):
-        if feature in feature_list[i]:
-            found = True
-            value = feature_list[i].split('=')[1]
-        else:
-            i += 1
-    if not found:
-        value = '0'
-    return value
-
-
 def NLC_to_dict(annotations):
     """
     Given a list of token annotations from ABBYY Compreno, transform it into dictionary.
@@ -58,20 +41,18 @@ def NLC_to_dict(annotations):
 
     Returns:
          NLC_dict (dict) — dict of annotations, keys are token offsets:
-            {offset (str): annotations (dict)}
-            annotations: {feature (str): value (str)}
+            {offset (int): annotation (token_record.Token)}
+            only wordform and NLC features of annotation are set, these are IDs
+            except for wordform (see nlc_records.parse_record())
     """
     NLC_dict = {}
     for annotation in annotations:
-        annotation_parts = annotation.strip('\n').split('\t')
-        annotation_dict = {}
-        offset = find_feature_value('Offset=', annotation_parts)
-        annotation_dict['wordform'] = find_feature_value('Text=', annotation_parts)
-        annotation_dict['semantic_class'] = find_feature_value('SC=', annotation_parts)
-        annotation_dict['semantic_slot'] = find_feature_value('SemSlot=', annotation_parts)
-        annotation_dict['surface_slot'] = find_feature_value('SurfSlot=', annotation_parts)
-        annotation_dict['syntax_paradigm'] = find_feature_value('SP=', annotation_parts)
-        NLC_dict[offset] = annotation_dict
+        record = parse_record(annotation)
+        NLC_dict[int(record['offset'])] = Token(wordform=record['wordform'],
+                                                semantic_class=record['semantic_class'],
+                                                semantic_slot=record['semantic_slot'],
+                                                surface_slot=record['surface_slot'],
+                                                syntax_paradigm=record['syntax_paradigm'])
     return NLC_dict
 
 
@@ -81,24 +62,20 @@ def tokens_to_dict(annotations, doc_id):
 
     Args:
         annotations (list of strs) — list with annotations: each list item is
-            a separate annotation
+            a separate annotation (usually only the lines of the document,
+            see tokens_index.read_document())
         doc_id (str) — id of a given documents
     Returns:
         tokens_dict (dict) — dict of annotations, keys are token offsets:
-            {offset (str): annotation_dict (dict)}
-            annotation_dict: {feature (str): value (str)}
+            {offset (int): annotation (token_record.Token)}
     """
     tokens_dict = {}
     for annotation in annotations:
         annotation_parts = annotation.strip('\n').split('\t')
-        annotation_dict = {}
-        if annotation.startswith(doc_id):
-            offset = annotation_parts[1]
-            annotation_dict['wordform'] = annotation_parts[3]
-            annotation_dict['chain_id'] = annotation_parts[6]
-            annotation_dict['group_id'] = annotation_parts[7]
-            annotation_dict['link_id'] = annotation_parts[8]
-            tokens_dict[offset] = annotation_dict
+        if annotation_parts[0] == doc_id:
+            offset = int(annotation_parts[1])
+            tokens_dict[offset] = Token(wordform=annotation_parts[3], chain_id=annotation_parts[6],
+                                        group_id=annotation_parts[7], link_id=annotation_parts[8])
     return tokens_dict
 
 
@@ -128,16 +105,16 @@ def merge_features(current_token, current_nlc):
     Add information from NLC dictionary to annotation from RuCor dictionary.
 
     Args:
-        current_token (dict) — annotation of a specific token from RuCor
-        current_nlc (dict) — annotation of a specific token from NLC_dict
+        current_token (token_record.Token) — annotation of a specific token from RuCor
+        current_nlc (token_record.Token) — annotation of a specific token from NLC_dict
     Returns:
-        current_token (dict) — updated RuCor annotation
+        current_token (token_record.Token) — updated RuCor annotation
     """
-    current_token['wordform'] = current_nlc['wordform']
-    current_token['semantic_class'] = current_nlc['semantic_class']
-    current_token['semantic_slot'] = current_nlc['semantic_slot']
-    current_token['surface_slot'] = current_nlc['surface_slot']
-    current_token['syntax_paradigm'] = current_nlc['syntax_paradigm']
+    current_token.wordform = current_nlc.wordform
+    current_token.semantic_class = current_nlc.semantic_class
+    current_token.semantic_slot = current_nlc.semantic_slot
+    current_token.surface_slot = current_nlc.surface_slot
+    current_token.syntax_paradigm = current_nlc.syntax_paradigm
     return current_token
 
 
@@ -167,55 +144,33 @@ def do_morphology(rucor, morph):
     Adds morphological information for the token.
     Args:
         rucor (dict) — dictionary with token information
-        morph (pymorphy2.MorphAnalyzer()) — morphological analyzer, used for morphological
+        morph (morph_cache.MorphCache) — cache of morphological parses, used for morphological
             parsing of the token itself
     Returns:
         rucor (dict) — updated dictionary with morphological information
     """
 
     for token_offset in rucor:
-        word = rucor[token_offset]['wordform']
-        rucor[token_offset]['morphology'] = str(morph.parse(word)[0].tag)
+        word = rucor[token_offset].wordform
+        rucor[token_offset].morphology = morph.parse(word)[1]
     return rucor
 
 
-def get_id(annot_string, regex):
-    """
-    Gives an ID of a particular value.
-
-    Args:
-        annot_string (str) — a string with a particular feature value and its ID in it
-        regex (regular expression) — a regex for searching the ID
-    Returns:
-        id (str) — value ID
-    """
-    id = '0'
-    try:
-        id = re.search(string=annot_string, pattern=regex).group(1)
-    except:
-        pass
-    return id
-
-
-def line_to_write(annotation, reg_id):
+def line_to_write(annotation):
     """
     Assembles a line to write in the dataset from a particular annotation.
 
     Args:
-        annotation (dict) — annotation of a particular token
-        reg_id (regular expression) — regex for searching value ID
+        annotation (token_record.Token) — annotation of a particular token
     Returns:
         line (str) — line with token annotation
     """
     data = []
 
-    if (annotation['morphology'] != 'PNCT') and ('semantic_class' in annotation):
-        sem_class_id = get_id(annotation['semantic_class'], reg_id)
-        sem_slot_id = get_id(annotation['semantic_slot'], reg_id)
-        surf_slot_id = get_id(annotation['surface_slot'], reg_id)
-        synt_par_id = get_id(annotation['syntax_paradigm'], reg_id)
-        data = [sem_class_id, sem_slot_id, surf_slot_id, synt_par_id, annotation['morphology'],
-                annotation['group_id'], annotation['chain_id'], annotation['link_id']]
+    if (annotation.morphology != 'PNCT') and annotation.has_nlc():
+        data = [annotation.semantic_class, annotation.semantic_slot, annotation.surface_slot,
+                annotation.syntax_paradigm, annotation.morphology,
+                annotation.group_id, annotation.chain_id, annotation.link_id]
 
     line = ','.join(data) + '\n'
     return line
@@ -237,50 +192,111 @@ def save_dataset(rucor, original_id):
         os.makedirs(folder_path)
     file_path = folder_path + os.sep + original_id + '.csv'
 
-    reg_id = re.compile('\(([0-9]+)\)')
     with open(file_path, 'w', encoding='utf-8') as dataset_file:
         for offset in rucor:
-            line = line_to_write(rucor[offset], reg_id)
+            line = line_to_write(rucor[offset])
             if line != '\n':
                 dataset_file.write(line)
 
 
-def main():
-    morph = MorphAnalyzer()
+# read-only data shared by all documents, see init_worker()
+shared = {}
+
+
+def init_worker(tokens_path, tokens_index, files_and_ids, nlc_folder):
+    """
+    Stores data shared by all documents, so that it's passed to every worker process
+    only once and not with every document.
+
+    Args:
+        tokens_path (str) — path to the file with RuCor tokens
+        tokens_index (dict) — index of documents in it, see tokens_index.build_tokens_index()
+        files_and_ids (dict) — mapping of files and doc_ids, see filenames_ids()
+        nlc_folder (str) — path to the folder with NLC files
+    Returns:
+        none
+    """
+    shared['tokens_path'] = tokens_path
+    shared['tokens_index'] = tokens_index
+    shared['files_and_ids'] = files_and_ids
+    shared['nlc_folder'] = nlc_folder
+
+
+def process_document(item, original_name):
+    """
+    Merges NLC and RuCor annotations of a single document and saves them as a dataset.
+
+    Args:
+        item (str) — name of the NLC file
+        original_name (str) — name of the original text
+    Returns:
+        nlc_path (str) — path to the processed NLC file
+    """
+    # NLC
+    nlc_path = shared['nlc_folder'] + os.sep + item
+    nlc = NLC_to_dict(read_info(nlc_path, header=False))
+    # RuCor
+    original_id = shared['files_and_ids'][original_name]
+    rucor = tokens_to_dict(read_document(shared['tokens_path'], shared['tokens_index'], original_id),
+                           doc_id=original_id)
+    # merging
+    rucor = text_and_tokens(rucor, nlc)
+    rucor = do_morphology(rucor, morph_cache())
+    # save
+    save_dataset(rucor, original_id)
+    return nlc_path
+
+
+def process_document_args(args):
+    return process_document(*args)
+
+
+def main(workers=1):
     reg_new_name = re.compile('[0-9]{,9}-#')
 
     tokens_path = '..' + os.sep + '..' + os.sep + 'RuCor' + os.sep + '!new_tokens.txt'
     documents_path = tokens_path.replace('!new_tokens', 'Documents')
     nlc_folder = '..' + os.sep + '..' + os.sep + 'RuCor' + os.sep + '!all-in-one'
 
-    all_tokens = read_info(tokens_path, header=True)
+    tokens_index = load_tokens_index(tokens_path, header=True)
     files_and_ids = filenames_ids(documents_path)
     filenames = set(files_and_ids.keys())
 
     counter = 1
     total = len(os.listdir(nlc_folder))
 
+    documents = []
     for item in os.listdir(nlc_folder):
         if item.endswith('.csv'):
             original_name = reg_new_name.sub('', item).strip('.csv')
             if original_name in filenames:
-                # NLC
-                nlc_path = nlc_folder + os.sep + item
-                nlc = NLC_to_dict(read_info(nlc_path, header=False))
-                # RuCor
-                original_id = files_and_ids[original_name]
-                rucor = tokens_to_dict(all_tokens, doc_id=original_id)
-                # merging
-                rucor = text_and_tokens(rucor, nlc)
-                rucor = do_morphology(rucor, morph)
-                # save
-                save_dataset(rucor, original_id)
-                # kinda logging print
-                now = datetime.now()
-                print('{0:2d}:{1:2d}:{2:2d}\t{3:3d}/{4:3d}\tfile: {5}\t\t\tdone: {6:.2f}%'.format(now.hour, now.minute,
-                    now.second, counter, total, nlc_path, counter / total * 100))
-                counter += 1
+                documents.append((item, original_name))
+
+    init_args = (tokens_path, tokens_index, files_and_ids, nlc_folder)
+    if workers > 1:
+        # каждый документ обрабатывается независимо, общие данные передаются воркерам один раз
+        pool = Pool(workers, initializer=init_worker, initargs=init_args)
+        done = pool.imap(process_document_args, documents)
+    else:
+        init_worker(*init_args)
+        done = map(process_document_args, documents)
+
+    for nlc_path in done:
+        # kinda logging print
+        now = datetime.now()
+        print('{0:2d}:{1:2d}:{2:2d}\t{3:3d}/{4:3d}\tfile: {5}\t\t\tdone: {6:.2f}%'.format(now.hour, now.minute,
+            now.second, counter, total, nlc_path, counter / total * 100))
+        counter += 1
+
+    if workers > 1:
+        pool.close()
+        pool.join()
+    else:
+        # в параллельном режиме кэш разборов у каждого воркера свой и не сохраняется
+        morph_cache().save()
 
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=1, help='number of worker processes')
+    main(workers=parser.parse_args().workers)
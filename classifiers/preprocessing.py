@@ -1,10 +1,21 @@
+import argparse
 from datetime import datetime
-from pymorphy2 import MorphAnalyzer
+import json
+import numpy as np
 import re
 import os
+import sys
 from sklearn.model_selection import train_test_split
+from token_record import Token
+from tokens_index import load_tokens_index, read_document
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from atomic_writer import AtomicWriter
+from morph_cache import morph_cache
+from nlc_records import parse_record
 
 
+SENTENCE_END = {'.', '!', '?', '...', '…'}
+
 
 def read_info(file_path, header):
     """
@@ -26,30 +37,6 @@ def read_info(file_path, header):
     return data
 
 
-def find_feature_value(feature, feature_list):
-    """
-    Finds a value of a given feature.
-
-    Args:
-        feature (str) — feature we're interested in
-        feature_list (list of strs) — list of strs which may contain the feature
-
-    Returns:
-         value (str) — value of the feature (if feature is present) or '0'
-    """
-    found = False
-    i = 0
-    while not found and i < len(feature_list):
-        if feature in feature_list[i]:
-            found = True
-            value = feature_list[i].split('=')[1]
-        else:
-            i += 1
-    if not found:
-        value = '0'
-    return value
-
-
 def NLC_to_dict(annotations):
     """
     Given a list of token annotations from ABBYY Compreno, transform it into dictionary.
@@ -60,20 +47,18 @@ def NLC_to_dict(annotations):
 
     Returns:
          NLC_dict (dict) — dict of annotations, keys are token offsets:
-            {offset (str): annotations (dict)}
-            annotations: {feature (str): value (str)}
+            {offset (int): annotation (token_record.Token)}
+            only wordform and NLC features of annotation are set, these are IDs
+            except for wordform (see nlc_records.parse_record())
     """
     NLC_dict = {}
     for annotation in annotations:
-        annotation_parts = annotation.strip('\n').split('\t')
-        annotation_dict = {}
-        offset = find_feature_value('Offset=', annotation_parts)
-        annotation_dict['wordform'] = find_feature_value('Text=', annotation_parts)
-        annotation_dict['semantic_class'] = find_feature_value('SC=', annotation_parts)
-        annotation_dict['semantic_slot'] = find_feature_value('SemSlot=', annotation_parts)
-        annotation_dict['surface_slot'] = find_feature_value('SurfSlot=', annotation_parts)
-        annotation_dict['syntax_paradigm'] = find_feature_value('SP=', annotation_parts)
-        NLC_dict[offset] = annotation_dict
+        record = parse_record(annotation)
+        NLC_dict[int(record['offset'])] = Token(wordform=record['wordform'],
+                                                semantic_class=record['semantic_class'],
+                                                semantic_slot=record['semantic_slot'],
+                                                surface_slot=record['surface_slot'],
+                                                syntax_paradigm=record['syntax_paradigm'])
     return NLC_dict
 
 
@@ -83,24 +68,20 @@ def tokens_to_dict(annotations, doc_id):
 
     Args:
         annotations (list of strs) — list with annotations: each list item is
-            a separate annotation
+            a separate annotation (usually only the lines of the document,
+            see tokens_index.read_document())
         doc_id (str) — id of a given documents
     Returns:
         tokens_dict (dict) — dict of annotations, keys are token offsets:
-            {offset (str): annotation_dict (dict)}
-            annotation_dict: {feature (str): value (str)}
+            {offset (int): annotation (token_record.Token)}
     """
     tokens_dict = {}
     for annotation in annotations:
         annotation_parts = annotation.strip('\n').split('\t')
-        annotation_dict = {}
-        if annotation.startswith(doc_id):
-            offset = annotation_parts[1]
-            annotation_dict['wordform'] = annotation_parts[3]
-            annotation_dict['chain_id'] = annotation_parts[6]
-            annotation_dict['group_id'] = annotation_parts[7]
-            annotation_dict['link_id'] = annotation_parts[8]
-            tokens_dict[offset] = annotation_dict
+        if annotation_parts[0] == doc_id:
+            offset = int(annotation_parts[1])
+            tokens_dict[offset] = Token(wordform=annotation_parts[3], chain_id=annotation_parts[6],
+                                        group_id=annotation_parts[7], link_id=annotation_parts[8])
     return tokens_dict
 
 
@@ -130,16 +111,16 @@ def merge_features(current_token, current_nlc):
     Add information from NLC dictionary to annotation from RuCor dictionary.
 
     Args:
-        current_token (dict) — annotation of a specific token from RuCor
-        current_nlc (dict) — annotation of a specific token from NLC_dict
+        current_token (token_record.Token) — annotation of a specific token from RuCor
+        current_nlc (token_record.Token) — annotation of a specific token from NLC_dict
     Returns:
-        current_token (dict) — updated RuCor annotation
+        current_token (token_record.Token) — updated RuCor annotation
     """
-    current_token['wordform'] = current_nlc['wordform']
-    current_token['semantic_class'] = current_nlc['semantic_class']
-    current_token['semantic_slot'] = current_nlc['semantic_slot']
-    current_token['surface_slot'] = current_nlc['surface_slot']
-    current_token['syntax_paradigm'] = current_nlc['syntax_paradigm']
+    current_token.wordform = current_nlc.wordform
+    current_token.semantic_class = current_nlc.semantic_class
+    current_token.semantic_slot = current_nlc.semantic_slot
+    current_token.surface_slot = current_nlc.surface_slot
+    current_token.syntax_paradigm = current_nlc.syntax_paradigm
     return current_token
 
 
@@ -169,34 +150,35 @@ def do_morphology(rucor, morph):
     Adds morphological information for the token.
     Args:
         rucor (dict) — dictionary with token information
-        morph (pymorphy2.MorphAnalyzer()) — morphological analyzer, used for morphological
+        morph (morph_cache.MorphCache) — cache of morphological parses, used for morphological
             parsing of the token itself
     Returns:
         rucor (dict) — updated dictionary with morphological information
     """
 
     for token_offset in rucor:
-        word = rucor[token_offset]['wordform']
-        rucor[token_offset]['morphology'] = str(morph.parse(word)[0].tag)
+        word = rucor[token_offset].wordform
+        rucor[token_offset].morphology = morph.parse(word)[1]
     return rucor
 
 
-def get_id(annot_string, regex):
+def sentence_numbers(rucor):
     """
-    Gives an ID of a particular value.
+    Numbers sentences of the document, a sentence ends with one of the SENTENCE_END tokens.
 
     Args:
-        annot_string (str) — a string with a particular feature value and its ID in it
-        regex (regular expression) — a regex for searching the ID
+        rucor (dict) — dictionary with token information, tokens in the order of the text
     Returns:
-        id (str) — value ID
+        sentences (dict) — number of sentence of every token:
+            {offset (int): sentence_number (int)}
     """
-    id = '0'
-    try:
-        id = re.search(string=annot_string, pattern=regex).group(1)
-    except:
-        pass
-    return id
+    sentences = {}
+    sentence_number = 0
+    for token_offset in rucor:
+        sentences[token_offset] = sentence_number
+        if rucor[token_offset].wordform in SENTENCE_END:
+            sentence_number += 1
+    return sentences
 
 
 def dataset(annotation):
@@ -204,19 +186,15 @@ def dataset(annotation):
     Leaves information necessary only for dataset.
 
     Args:
-        annotation (dict) — annotation of a particular token
+        annotation (token_record.Token) — annotation of a particular token
     Returns:
         data (list of strs) — dataset information
     """
     data = []
-    reg_id = re.compile('\(([0-9]+)\)')
-    if (annotation['morphology'] != 'PNCT') and ('semantic_class' in annotation):
-        sem_class_id = get_id(annotation['semantic_class'], reg_id)
-        sem_slot_id = get_id(annotation['semantic_slot'], reg_id)
-        surf_slot_id = get_id(annotation['surface_slot'], reg_id)
-        synt_par_id = get_id(annotation['syntax_paradigm'], reg_id)
-        data = [sem_class_id, sem_slot_id, surf_slot_id, synt_par_id, annotation['morphology'],
-                annotation['group_id'], annotation['chain_id'], annotation['link_id']]
+    if (annotation.morphology != 'PNCT') and annotation.has_nlc():
+        data = [annotation.semantic_class, annotation.semantic_slot, annotation.surface_slot,
+                annotation.syntax_paradigm, annotation.morphology,
+                annotation.group_id, annotation.chain_id, annotation.link_id]
     return data
 
 
@@ -244,23 +222,92 @@ def save_dataset(rucor, original_id):
                 dataset_file.write(line)
 
 
-def embeddings():
+class EmbeddingStore:
     """
-    Given a .txt file with embeddings of length 200, returns a dictionary containing the embeddings.
+    Embeddings of semantic classes, kept in a memory-mapped matrix (see convert_embeddings()).
+    Works like a dictionary {semantic_class_id (str): embeddings (list of floats)},
+    but only first dims values of each embedding are given.
+    """
+    def __init__(self, matrix, index, dims):
+        self.matrix = matrix
+        self.index = index
+        self.dims = dims
+
+    def __contains__(self, sc_id):
+        return sc_id in self.index
+
+    def __getitem__(self, sc_id):
+        # float32 values are printed as the shortest float32 repr (0.1, not 0.10000000149011612)
+        return [float(str(value)) for value in self.matrix[self.index[sc_id], :self.dims]]
+
+    def __len__(self):
+        return len(self.index)
+
+    def keys(self):
+        return self.index.keys()
+
+    def lookup(self, sc_ids):
+        """
+        Gives embeddings of several semantic classes at once; unknown classes get zeros.
+        """
+        rows = np.array([self.index.get(sc_id, -1) for sc_id in sc_ids], dtype=np.int64)
+        vectors = np.zeros((len(rows), self.dims), dtype=np.float32)
+        known = rows >= 0
+        vectors[known] = self.matrix[rows[known], :self.dims]
+        return vectors
+
+
+def convert_embeddings(embeddings_path, matrix_path, index_path):
+    """
+    Converts a .txt file with embeddings into a binary matrix (.npy) and a list of
+    semantic class IDs, where the line number is the row of the matrix.
 
     Args:
+        embeddings_path (str) — path to the .txt file with embeddings (the first line is a header)
+        matrix_path (str) — path to save the matrix at
+        index_path (str) — path to save semantic class IDs at
+    Returns:
         none
+    """
+    sc_ids = []
+    vectors = []
+    with open(embeddings_path, 'r', encoding='utf-8') as f:
+        f.readline()
+        for line in f:
+            items = line.strip('\r\n').split(maxsplit=1)
+            if len(items) == 2:
+                sc_ids.append(items[0])
+                vectors.append(np.array(items[1].split(), dtype=np.float32))
+    # both files are written to temporary paths first, so that an interrupted run leaves no
+    # half-written file, and a matrix with an index of other embeddings is rebuilt (see embeddings())
+    with AtomicWriter(index_path) as f:
+        f.write('\n'.join(sc_ids))
+    with open(matrix_path + '.tmp', 'wb') as f:
+        np.save(f, np.vstack(vectors))
+    os.replace(matrix_path + '.tmp', matrix_path)
+
+
+def embeddings(dims=4):
+    """
+    Given a .txt file with embeddings of length 200, returns a store containing the embeddings.
+    The file is converted into a binary matrix only once, next runs just memory-map it.
+
+    Args:
+        dims (int) — how many first values of embeddings to use
     Returns:
-         embeddings_dict — dictionary, formatted as follows:
+         embeddings_dict (EmbeddingStore) — works as a dictionary, formatted as follows:
             {semantic_class_id (str): embeddings (list of floats)}
     """
     embeddings_path = '.' + os.sep + 'embeddings.txt'
-    embeddings_dict = {}
-    for line in open(embeddings_path, 'r', encoding='utf-8').readlines()[1:]:
-        items = line.strip('\r\n').split(maxsplit=1)
-        # [:4] — берём только первые 4 значения из эмбеддингов
-        embeddings_dict[items[0]] = [float(num) for num in items[1].split(' ')[:4]]
-    return embeddings_dict
+    matrix_path = '.' + os.sep + 'embeddings.npy'
+    index_path = '.' + os.sep + 'embeddings_index.txt'
+    if any(not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(embeddings_path)
+           for path in (matrix_path, index_path)):
+        convert_embeddings(embeddings_path, matrix_path, index_path)
+    with open(index_path, 'r', encoding='utf-8') as f:
+        index = {sc_id: row for row, sc_id in enumerate(f.read().split('\n'))}
+    # dims=4 — берём только первые 4 значения из эмбеддингов
+    return EmbeddingStore(np.load(matrix_path, mmap_mode='r'), index, dims)
 
 
 def syntpar():
@@ -319,11 +366,11 @@ def modify_token(token, embeddings_dict, synt_paradigms_bin):
     """
     token_items = token.split(';')
     sem_class = token_items[0]
-    if sem_class in embeddings_dict.keys():
+    if sem_class in embeddings_dict:
         sem_emb = str(embeddings_dict[sem_class])
     else:
         # если такого семантического класса нет в эмбеддингх, то просто нули
-        sem_emb = str([0.0] * 4)
+        sem_emb = str([0.0] * embeddings_dict.dims)
     token_items[0] = sem_emb
     synt_id = token_items[3]
     if synt_id in synt_paradigms_bin.keys():
@@ -335,30 +382,134 @@ def modify_token(token, embeddings_dict, synt_paradigms_bin):
     return ready_token
 
 
-def create_pairs(tokens):
-    pairs = []
-    pairs_result = []
-    i = 0
-    while i < len(tokens):
-        token1 = tokens[i]
-        chain_id_1 = token1.split(';')[-2]
-        j = 0
-        while j < len(tokens):
-            if i != j:
-                token2 = tokens[j]
-                chain_id_2 = token2.split(';')[-2]
-                if (chain_id_1 != '-') and (chain_id_2 != '-'):
-                    token1_semantic = token1.split(';')[0]
-                    token1_syntax = token1.split(';')[3]
-                    token2_semantic = token2.split(';')[0]
-                    token2_syntax = token2.split(';')[3]
-                    pairs.append([token1_semantic, token1_syntax, token2_semantic, token2_syntax])
-                    if (chain_id_1 in chain_id_2) or (chain_id_2 in chain_id_1):
-                        pairs_result.append(1)
-                    else:
-                        pairs_result.append(0)
-            j += 1
-        i += 1
+def token_features(tokens, embeddings_dict, synt_paradigms_bin):
+    """
+    Turns dataset tokens into a numeric matrix, which is used for creating pairs.
+
+    Args:
+        tokens (list of strs) — dataset tokens, features joined with ';' (see dataset())
+        embeddings_dict (EmbeddingStore) — embeddings of semantic classes, see embeddings()
+        synt_paradigms_bin (dict) — binarized syntax paradigms, see syntpar()
+    Returns:
+        features (numpy.ndarray) — matrix of floats, one row per token:
+            [semantic class embedding, binarized syntax paradigm]
+    """
+    token_items = [token.split(';') for token in tokens]
+    emb_size = embeddings_dict.dims
+    features = np.zeros((len(tokens), emb_size + len(synt_paradigms_bin)), dtype=np.float32)
+    features[:, :emb_size] = embeddings_dict.lookup([items[0] for items in token_items])
+    for i, items in enumerate(token_items):
+        synt_id = items[3]
+        if synt_id in synt_paradigms_bin:
+            features[i, emb_size:] = synt_paradigms_bin[synt_id]
+    return features
+
+
+def chain_incidence(tokens):
+    """
+    Finds out which chains every token belongs to.
+
+    Args:
+        tokens (list of strs) — dataset tokens, features joined with ';' (see dataset());
+            chain IDs are the second feature from the end, several IDs are joined with ','
+    Returns:
+        incidence (numpy.ndarray) — boolean matrix, rows are tokens and columns are chains;
+            tokens without any chain ('-') have rows of zeros
+    """
+    chain_columns = {}
+    rows = []
+    columns = []
+    for i, token in enumerate(tokens):
+        chain_ids = token.split(';')[-2]
+        if chain_ids != '-':
+            for chain_id in chain_ids.split(','):
+                rows.append(i)
+                columns.append(chain_columns.setdefault(chain_id.strip(), len(chain_columns)))
+    incidence = np.zeros((len(tokens), len(chain_columns)), dtype=bool)
+    incidence[rows, columns] = True
+    return incidence
+
+
+def window_pairs(mentions, positions, window):
+    """
+    Creates pairs (antecedent, anaphor) of mentions which are not further than window from each other.
+
+    Args:
+        mentions (numpy.ndarray) — indices of tokens which belong to any chain, sorted
+        positions (numpy.ndarray) — non-decreasing position of every token: its index
+            or the number of its sentence
+        window (int) — maximal distance between positions of an antecedent and an anaphor
+    Returns:
+        antecedents (numpy.ndarray) — token indices of antecedents
+        anaphors (numpy.ndarray) — token indices of anaphors, each anaphor follows its antecedent
+    """
+    mention_positions = positions[mentions]
+    starts = np.searchsorted(mention_positions, mention_positions - window, side='left')
+    counts = np.arange(len(mentions)) - starts
+    anaphors = np.repeat(np.arange(len(mentions)), counts)
+    shifts = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    antecedents = np.repeat(starts, counts) + shifts
+    return mentions[antecedents], mentions[anaphors]
+
+
+def sample_negatives(pairs_result, negative_ratio, seed):
+    """
+    Chooses pairs to keep: all positive pairs and no more than negative_ratio negative pairs per positive one.
+
+    Args:
+        pairs_result (numpy.ndarray) — 1 if tokens of the pair are coreferent, otherwise 0
+        negative_ratio (float) — how many negative pairs to keep per positive pair
+        seed (int) — seed for random choice of negative pairs
+    Returns:
+        kept (numpy.ndarray) — sorted indices of pairs to keep
+    """
+    positive = np.flatnonzero(pairs_result)
+    negative = np.flatnonzero(pairs_result == 0)
+    negatives_count = min(len(negative), int(round(negative_ratio * len(positive))))
+    negative = np.random.RandomState(seed).choice(negative, negatives_count, replace=False)
+    return np.sort(np.concatenate([positive, negative]))
+
+
+def create_pairs(features, incidence, window=None, positions=None, negative_ratio=None, seed=42):
+    """
+    Creates pairs of tokens which belong to any chain. Two tokens are coreferent if they
+    share at least one chain.
+
+    By default all ordered pairs are created, pairs (i, i) excluded. If window is given,
+    only pairs (antecedent, anaphor) not further than window from each other are created,
+    so the number of pairs grows linearly with the length of the document.
+
+    Args:
+        features (numpy.ndarray) — features of tokens, see token_features()
+        incidence (numpy.ndarray) — chains of tokens, see chain_incidence()
+        window (int or None) — maximal distance between tokens of a pair
+        positions (list of ints or None) — position of every token to measure the distance,
+            e.g. the number of its sentence; if none, the token index is used
+        negative_ratio (float or None) — if given, all positive pairs are kept together with
+            no more than negative_ratio negative pairs per positive one
+        seed (int) — seed for random choice of negative pairs
+    Returns:
+        pairs (numpy.ndarray) — pair features, one row per pair:
+            [features of the 1st token, features of the 2nd token]
+        pairs_result (numpy.ndarray) — 1 if tokens of the pair are coreferent, otherwise 0
+    """
+    mentions = np.flatnonzero(incidence.any(axis=1))
+    if window is None:
+        first, second = np.meshgrid(mentions, mentions, indexing='ij')
+        different = first != second
+        mention_chains = incidence[mentions].astype(np.int32)
+        shared_chains = mention_chains @ mention_chains.T
+        first, second = first[different], second[different]
+        pairs_result = (shared_chains[different] > 0).astype(np.int8)
+    else:
+        if positions is None:
+            positions = np.arange(len(incidence))
+        first, second = window_pairs(mentions, np.asarray(positions), window)
+        pairs_result = (incidence[first] & incidence[second]).any(axis=1).astype(np.int8)
+    if negative_ratio is not None:
+        kept = sample_negatives(pairs_result, negative_ratio, seed)
+        first, second, pairs_result = first[kept], second[kept], pairs_result[kept]
+    pairs = np.hstack([features[first], features[second]])
     # print('pairs: {0}, results: {1}'.format(len(pairs), len(pairs_result)))
     return pairs, pairs_result
 
@@ -378,6 +529,96 @@ def extract_mention_candidates(tokens, noun_paradigm, candidates_features, candi
     return candidates_features, candidates_results
 
 
+def mention_features(tokens, features, noun_paradigm_id, emb_size):
+    """
+    Numeric version of extract_mention_candidates(): chooses tokens with the noun syntax paradigm.
+
+    Args:
+        tokens (list of strs) — dataset tokens, features joined with ';' (see dataset())
+        features (numpy.ndarray) — features of tokens, see token_features()
+        noun_paradigm_id (str) — ID of the noun syntax paradigm
+        emb_size (int) — length of semantic class embeddings in features
+    Returns:
+        candidates_features (numpy.ndarray) — matrix of floats, one row per candidate:
+            [semantic class embedding, semantic slot ID, surface slot ID, binarized syntax paradigm]
+        candidates_results (numpy.ndarray) — 1 if the candidate is in any group, otherwise 0
+    """
+    token_items = [token.split(';') for token in tokens]
+    candidates = [i for i in range(len(tokens)) if token_items[i][3] == noun_paradigm_id]
+    slots = np.array([[float(token_items[i][1]), float(token_items[i][2])] for i in candidates],
+                     dtype=np.float32).reshape(-1, 2)
+    candidates_features = np.hstack([features[candidates, :emb_size], slots, features[candidates, emb_size:]])
+    candidates_results = np.array([token_items[i][-3] != '-' for i in candidates], dtype=np.int8)
+    return candidates_features, candidates_results
+
+
+def feature_columns(emb_size, paradigm_ids):
+    """
+    Gives names of the columns of token_features().
+
+    Args:
+        emb_size (int) — length of semantic class embeddings
+        paradigm_ids (list of strs) — IDs of syntax paradigms in the order of binarization
+    Returns:
+        columns (list of strs) — names of the columns
+    """
+    return ['sem_{}'.format(i) for i in range(emb_size)] + ['synt_{}'.format(par_id) for par_id in paradigm_ids]
+
+
+def save_into_binary(information, path, selection, values):
+    """
+    Saves features as a float32 matrix or results as an int8 vector in .npy file,
+    which can be memory-mapped (see load_binary()).
+
+    Args:
+        information (numpy.ndarray or list) — features or results
+        path (str) — common part of the path for a file
+        selection (str) — 'train' or 'test'
+        values (str) — 'features' or 'results'
+    Returns:
+        none
+    """
+    path = path + '_' + selection + '_' + values + '.npy'
+    dtype = np.int8 if values == 'results' else np.float32
+    np.save(path, np.asarray(information, dtype=dtype))
+
+
+def save_schema(path, columns):
+    """
+    Saves names of the feature columns and types of the arrays next to the .npy files.
+
+    Args:
+        path (str) — common part of the path for a file
+        columns (list of strs) — names of the feature columns
+    Returns:
+        none
+    """
+    schema = {'columns': columns, 'features': 'float32', 'results': 'int8'}
+    with open(path + '_schema.json', 'w', encoding='utf-8') as f:
+        json.dump(schema, f, ensure_ascii=False, indent=2)
+
+
+def load_binary(path, selection, mmap=True):
+    """
+    Loads features and results saved by save_data(binary=True).
+
+    Args:
+        path (str) — common part of the path for a file
+        selection (str) — 'train' or 'test'
+        mmap (bool) — whether to memory-map the arrays instead of reading them
+    Returns:
+        features (numpy.ndarray) — matrix of float32 features
+        results (numpy.ndarray) — vector of int8 results
+        columns (list of strs) — names of the feature columns
+    """
+    mmap_mode = 'r' if mmap else None
+    features = np.load(path + '_' + selection + '_features.npy', mmap_mode=mmap_mode)
+    results = np.load(path + '_' + selection + '_results.npy', mmap_mode=mmap_mode)
+    with open(path + '_schema.json', 'r', encoding='utf-8') as f:
+        columns = json.load(f)['columns']
+    return features, results, columns
+
+
 def save_into_file(information, path, selection, values):
     path = path + '_' + selection + '_' + values + '.txt'
     new_information = []
@@ -385,6 +626,8 @@ def save_into_file(information, path, selection, values):
         if values != 'results':
             if type(piece) == list:
                 line = ', '.join(piece)
+            elif type(piece) == np.ndarray:
+                line = ', '.join(str(value) for value in piece)
             else:
                 line = piece
             line = line.replace(']', '')
@@ -405,51 +648,71 @@ def split_data(features, results):
     return features_train, features_test, res_train, res_test
 
 
-def save_data(ready_path, features, results, filename):
+def save_data(ready_path, features, results, filename, binary=False, columns=None):
+    # e.g. no pairs are left if there are no positive pairs in the window and negatives are sampled
+    if len(results) < 2:
+        print('Nothing to save: {0} results'.format(len(results)))
+        return
     if not os.path.exists(ready_path):
         os.makedirs(ready_path)
     train, test, res_train, res_test = train_test_split(features, results, test_size=0.33)
     print('Train: {0} features, {1} results'.format(len(train), len(res_train)))
     print('Test: {0} features, {1} results'.format(len(test), len(res_test)))
     common_part = ready_path + os.sep + filename[:-4]
-    save_into_file(train, common_part, selection='train', values='features')
-    save_into_file(test, common_part, selection='test', values='features')
-    save_into_file(res_train, common_part, selection='train', values='results')
-    save_into_file(res_test, common_part, selection='test', values='results')
-
-
-def add_embeddings_save(emb_dict, bin_par, tokens, doc_id):
+    # binary — .npy вместо .txt, названия колонок сохраняются в _schema.json
+    save = save_into_binary if binary else save_into_file
+    save(train, common_part, selection='train', values='features')
+    save(test, common_part, selection='test', values='features')
+    save(res_train, common_part, selection='train', values='results')
+    save(res_test, common_part, selection='test', values='results')
+    if binary:
+        save_schema(common_part, columns)
+
+
+def add_embeddings_save(emb_dict, bin_par, tokens, doc_id, sentences=None, window=None, window_unit='tokens',
+                        negative_ratio=None, seed=42, binary=False):
     mention_candidates = []
     mention_candidates_results = []
 
-    tokens = [modify_token(token, embeddings_dict=emb_dict, synt_paradigms_bin=bin_par) for token in tokens]
-
     # пары токенов: кореферентны или нет
-    pair_features, pair_results = create_pairs(tokens)
+    # window — окно между антецедентом и анафором в токенах или предложениях (window_unit)
+    positions = sentences if window_unit == 'sentences' else None
+    features = token_features(tokens, embeddings_dict=emb_dict, synt_paradigms_bin=bin_par)
+    emb_size = features.shape[1] - len(bin_par)
+    columns = feature_columns(emb_size, list(bin_par.keys()))
+    pair_features, pair_results = create_pairs(features, chain_incidence(tokens), window=window, positions=positions,
+                                               negative_ratio=negative_ratio, seed=seed)
     ready_path_pairs = '.' + os.sep + 'data_ready1' + os.sep + 'pairs'
     print('=== PAIRS ===')
-    save_data(ready_path_pairs, pair_features, pair_results, filename=doc_id)
+    pair_columns = ['1_' + column for column in columns] + ['2_' + column for column in columns]
+    save_data(ready_path_pairs, pair_features, pair_results, filename=doc_id, binary=binary, columns=pair_columns)
 
     # является ли токен меншеном
     synt_noun_id = '7'
-    synt_noun_bin = str(bin_par[synt_noun_id])
-    mention_candidates, mention_candidates_results = extract_mention_candidates(tokens, synt_noun_bin,
-                                                                                mention_candidates,
-                                                                                mention_candidates_results)
+    if binary:
+        mention_candidates, mention_candidates_results = mention_features(tokens, features, synt_noun_id, emb_size)
+    else:
+        tokens = [modify_token(token, embeddings_dict=emb_dict, synt_paradigms_bin=bin_par) for token in tokens]
+        synt_noun_bin = str(bin_par[synt_noun_id])
+        mention_candidates, mention_candidates_results = extract_mention_candidates(tokens, synt_noun_bin,
+                                                                                    mention_candidates,
+                                                                                    mention_candidates_results)
     ready_path_mentions = ready_path_pairs.replace('pairs', 'mentions')
     print('=== MENTIONS ===')
-    save_data(ready_path_mentions, mention_candidates, mention_candidates_results, filename=doc_id)
+    mention_columns = columns[:emb_size] + ['sem_slot', 'surf_slot'] + columns[emb_size:]
+    save_data(ready_path_mentions, mention_candidates, mention_candidates_results, filename=doc_id, binary=binary,
+              columns=mention_columns)
 
 
-def merge_files():
-    morph = MorphAnalyzer()
+def merge_files(window=None, window_unit='tokens', negative_ratio=None, seed=42, binary=False):
+    morph = morph_cache()
     reg_new_name = re.compile('[0-9]{,9}-#')
 
     tokens_path = '..' + os.sep + '..' + os.sep + 'RuCor' + os.sep + '!new_tokens.txt'
     documents_path = tokens_path.replace('!new_tokens', 'Documents')
     nlc_folder = '..' + os.sep + '..' + os.sep + 'RuCor' + os.sep + '!all-in-one'
 
-    all_tokens = read_info(tokens_path, header=True)
+    tokens_index = load_tokens_index(tokens_path, header=True)
     files_and_ids = filenames_ids(documents_path)
     filenames = set(files_and_ids.keys())
 
@@ -464,14 +727,23 @@ def merge_files():
                 nlc = NLC_to_dict(read_info(nlc_path, header=False))
 
                 original_id = files_and_ids[original_name]
-                rucor = tokens_to_dict(all_tokens, doc_id=original_id)
+                rucor = tokens_to_dict(read_document(tokens_path, tokens_index, original_id), doc_id=original_id)
 
                 united_annotation = add_nlc_to_rucor(rucor, nlc)
                 united_annotation = do_morphology(united_annotation, morph)
 
-                data = [dataset(united_annotation[token]) for token in united_annotation]
-                add_embeddings_save(emb_dict, bin_par, data, original_name)
+                sentences = sentence_numbers(united_annotation)
+                data = []
+                data_sentences = []
+                for offset in united_annotation:
+                    token = dataset(united_annotation[offset])
+                    if token:
+                        data.append(';'.join(token))
+                        data_sentences.append(sentences[offset])
+                add_embeddings_save(emb_dict, bin_par, data, original_name, sentences=data_sentences, window=window,
+                                    window_unit=window_unit, negative_ratio=negative_ratio, seed=seed, binary=binary)
         break
+    morph.save()
 
 
 def main():
@@ -491,9 +763,10 @@ def main():
             with open(text_tokens, 'r', encoding='utf-8') as f:
                 tokens = [line.strip('\n') for line in f.readlines()[1:]]
             print('Overall: {} tokens'.format(len(tokens)))
-            tokens = [modify_token(token, embeddings_dict=emb_dict, synt_paradigms_bin=bin_par) for token in tokens]
             # пары токенов: кореферентны или нет
-            pair_features, pair_results = create_pairs(tokens)
+            features = token_features(tokens, embeddings_dict=emb_dict, synt_paradigms_bin=bin_par)
+            pair_features, pair_results = create_pairs(features, chain_incidence(tokens))
+            tokens = [modify_token(token, embeddings_dict=emb_dict, synt_paradigms_bin=bin_par) for token in tokens]
             ready_path_pairs = folder.replace('raw', 'ready') + os.sep + 'pairs'
             print('=== PAIRS ===')
             save_data(ready_path_pairs, pair_features, pair_results, filename=item)
@@ -509,4 +782,14 @@ def main():
 
 
 if __name__ == '__main__':
-    merge_files()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--window', type=int, default=None, help='maximal distance between tokens of a pair')
+    parser.add_argument('--window-unit', default='tokens', choices=['tokens', 'sentences'],
+                        help='unit of the window distance')
+    parser.add_argument('--negative-ratio', type=float, default=None,
+                        help='number of negative pairs kept per positive pair')
+    parser.add_argument('--seed', type=int, default=42, help='seed for sampling of negative pairs')
+    parser.add_argument('--binary', action='store_true', help='save features as .npy instead of .txt')
+    args = parser.parse_args()
+    merge_files(window=args.window, window_unit=args.window_unit, negative_ratio=args.negative_ratio, seed=args.seed,
+                binary=args.binary)
\ No newline at end of file
@@ -0,0 +1,125 @@
+import os
+import numpy as np
+from preprocessing import chain_incidence, create_pairs, embeddings, sample_negatives, save_data, window_pairs
+
+
+def write_embeddings(path, rows):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{0} 5\n'.format(len(rows)))
+        for sc_id, values in rows:
+            f.write('{0} {1}\n'.format(sc_id, ' '.join(str(value) for value in values)))
+
+
+def test_embeddings_rebuilt_without_index(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_embeddings('embeddings.txt', [('12', [0.1, 0.2, 0.3, 0.4, 0.5]), ('7', [1, 2, 3, 4, 5])])
+    assert embeddings()['12'] == [0.1, 0.2, 0.3, 0.4]
+    os.remove('embeddings_index.txt')
+    store = embeddings(dims=2)
+    assert store['7'] == [1.0, 2.0]
+    assert sorted(os.listdir('.')) == ['embeddings.npy', 'embeddings.txt', 'embeddings_index.txt']
+
+
+def test_embeddings_rebuilt_with_stale_index(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_embeddings('embeddings.txt', [('12', [0.1, 0.2, 0.3, 0.4, 0.5])])
+    embeddings()
+    write_embeddings('embeddings.txt', [('7', [1, 2, 3, 4, 5]), ('12', [0.5, 0.5, 0.5, 0.5, 0.5])])
+    # as if a run was interrupted after the matrix was saved: the index is older than the embeddings
+    np.save('embeddings.npy', np.ones((2, 5), dtype=np.float32))
+    past = os.path.getmtime('embeddings.txt') - 10
+    os.utime('embeddings_index.txt', (past, past))
+    store = embeddings()
+    assert store['7'] == [1.0, 2.0, 3.0, 4.0]
+    assert store['12'] == [0.5, 0.5, 0.5, 0.5]
+
+
+def dataset_token(chain_ids):
+    return ';'.join(['12', 'sem', 'surf', '7', 'NOUN', '-', chain_ids, '-'])
+
+
+def pair_indices(pairs):
+    # features of a token are its index, so a pair row is (index of 1st token, index of 2nd token)
+    return [tuple(row) for row in pairs.astype(int).tolist()]
+
+
+def test_chain_incidence():
+    incidence = chain_incidence([dataset_token(chain_ids) for chain_ids in ['1,12', '-', '12', '1']])
+    assert incidence.tolist() == [[True, True], [False, False], [False, True], [True, False]]
+
+
+def test_create_pairs_all_ordered_pairs():
+    tokens = [dataset_token(chain_ids) for chain_ids in ['1,12', '-', '12', '1', '-', '2']]
+    features = np.arange(len(tokens), dtype=float).reshape(-1, 1)
+    pairs, pairs_result = create_pairs(features, chain_incidence(tokens))
+    mentions = [0, 2, 3, 5]
+    # n * (n - 1) ordered pairs of mentions, tokens without chains are left out
+    assert len(pairs) == len(pairs_result) == len(mentions) * (len(mentions) - 1)
+    assert sorted(pair_indices(pairs)) == [(i, j) for i in mentions for j in mentions if i != j]
+    labels = dict(zip(pair_indices(pairs), pairs_result.tolist()))
+    # chains are compared as whole IDs: '1,12' shares a chain with '12' and with '1', '12' and '1' share none
+    assert labels[(0, 2)] == labels[(2, 0)] == 1
+    assert labels[(0, 3)] == labels[(3, 0)] == 1
+    assert labels[(2, 3)] == labels[(3, 2)] == 0
+    assert labels[(0, 5)] == labels[(5, 3)] == 0
+
+
+def test_create_pairs_without_mentions():
+    tokens = [dataset_token('-'), dataset_token('-')]
+    pairs, pairs_result = create_pairs(np.zeros((2, 3)), chain_incidence(tokens))
+    assert pairs.shape == (0, 6)
+    assert len(pairs_result) == 0
+
+
+def test_window_pairs_tokens():
+    mentions = np.array([0, 2, 3, 7])
+    antecedents, anaphors = window_pairs(mentions, np.arange(8), window=3)
+    assert list(zip(antecedents.tolist(), anaphors.tolist())) == [(0, 2), (0, 3), (2, 3)]
+
+
+def test_window_pairs_sentences():
+    mentions = np.array([0, 1, 2, 4, 5])
+    sentences = np.array([0, 0, 1, 1, 3, 3])
+    # tokens of the same sentence are paired with window 0, the antecedent always goes first
+    antecedents, anaphors = window_pairs(mentions, sentences, window=0)
+    assert list(zip(antecedents.tolist(), anaphors.tolist())) == [(0, 1), (4, 5)]
+    antecedents, anaphors = window_pairs(mentions, sentences, window=1)
+    assert list(zip(antecedents.tolist(), anaphors.tolist())) == [(0, 1), (0, 2), (1, 2), (4, 5)]
+
+
+def test_create_pairs_window():
+    tokens = [dataset_token(chain_ids) for chain_ids in ['1', '-', '1', '2', '-', '2', '1']]
+    features = np.arange(len(tokens), dtype=float).reshape(-1, 1)
+    pairs, pairs_result = create_pairs(features, chain_incidence(tokens), window=2)
+    assert pair_indices(pairs) == [(0, 2), (2, 3), (3, 5), (5, 6)]
+    assert pairs_result.tolist() == [1, 0, 1, 0]
+    sentences = [0, 0, 0, 1, 1, 2, 2]
+    pairs, pairs_result = create_pairs(features, chain_incidence(tokens), window=0, positions=sentences)
+    assert pair_indices(pairs) == [(0, 2), (5, 6)]
+    assert pairs_result.tolist() == [1, 0]
+
+
+def test_sample_negatives():
+    pairs_result = np.array([0, 1, 0, 0, 0, 1, 0, 0, 0, 0, 0, 0])
+    for seed in range(10):
+        kept = sample_negatives(pairs_result, negative_ratio=2, seed=seed)
+        # every positive pair and two negative pairs per positive one
+        assert set(kept.tolist()) >= {1, 5}
+        assert len(kept) == 6
+        assert list(kept) == sorted(kept)
+        assert kept.tolist() == sample_negatives(pairs_result, negative_ratio=2, seed=seed).tolist()
+    # there are fewer negative pairs than the ratio asks for
+    assert sample_negatives(pairs_result, negative_ratio=10, seed=0).tolist() == list(range(12))
+    assert len(sample_negatives(np.zeros(5, dtype=np.int8), negative_ratio=2, seed=0)) == 0
+
+
+def test_empty_document(tmp_path):
+    tokens = [dataset_token('-'), dataset_token('1'), dataset_token('-')]
+    pairs, pairs_result = create_pairs(np.zeros((3, 2)), chain_incidence(tokens), window=5, negative_ratio=1)
+    assert pairs.shape == (0, 4)
+    assert len(pairs_result) == 0
+    pairs, pairs_result = create_pairs(np.zeros((0, 2)), chain_incidence([]), window=5)
+    assert pairs.shape == (0, 4)
+    ready_path = str(tmp_path / 'pairs')
+    save_data(ready_path, pairs, pairs_result, filename='doc.txt')
+    assert not os.path.exists(ready_path)
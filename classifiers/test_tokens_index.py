@@ -0,0 +1,10 @@
+from tokens_index import build_tokens_index, read_document
+
+
+def test_read_document_crlf(tmp_path):
+    path = tmp_path / 'tokens.txt'
+    path.write_bytes('doc_id\tshift\ttoken\r\n1\t0\tмама\t-\r\n1\t5\tмыла\t3\r\n\r\n2\t0\tраму\t-\r\n'.encode('utf-8'))
+    index = build_tokens_index(str(path), header=True)
+    assert read_document(str(path), index, '1') == ['1\t0\tмама\t-', '1\t5\tмыла\t3']
+    assert read_document(str(path), index, '2') == ['2\t0\tраму\t-']
+    assert read_document(str(path), index, '3') == []
@@ -0,0 +1,29 @@
+import sys
+
+
+class Token:
+    """
+    Annotation of a single token: features from RuCor, from NLC / ABBYY Compreno and morphology.
+    Fields are fixed (no per-token dict), repeated values are interned, so that a whole corpus
+    fits into memory. Fields which are not known yet are None.
+    """
+    __slots__ = ('wordform', 'chain_id', 'group_id', 'link_id', 'semantic_class', 'semantic_slot',
+                 'surface_slot', 'syntax_paradigm', 'morphology')
+
+    def __init__(self, **features):
+        for field in self.__slots__:
+            value = features.get(field)
+            if value is not None:
+                value = sys.intern(value)
+            setattr(self, field, value)
+
+    def has_nlc(self):
+        """
+        Tells whether there is information from NLC for the token.
+        """
+        return self.semantic_class is not None
+
+    def __repr__(self):
+        features = ', '.join('{0}={1!r}'.format(field, getattr(self, field)) for field in self.__slots__
+                             if getattr(self, field) is not None)
+        return 'Token({})'.format(features)
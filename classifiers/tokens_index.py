@@ -0,0 +1,119 @@
+import os
+
+
+def index_path_for(tokens_path):
+    """
+    Gives a path to the index file, which is stored next to the file with tokens.
+
+    Args:
+        tokens_path (str) — path to the file with RuCor tokens
+    Returns:
+        index_path (str) — path to the index file
+    """
+    return os.path.splitext(tokens_path)[0] + '.idx'
+
+
+def build_tokens_index(tokens_path, header=True):
+    """
+    Reads the file with RuCor tokens once and finds byte ranges of every document in it.
+
+    Args:
+        tokens_path (str) — path to the file with RuCor tokens
+        header (bool) — whether there is any header in the file
+    Returns:
+        index (dict) — byte ranges of the documents:
+            {doc_id (str): [(start (int), end (int)), ...]}
+            usually a document is one range, but if its lines are scattered across
+            the file, there are several of them
+    """
+    index = {}
+    current_id = None
+    start = 0
+    position = 0
+    with open(tokens_path, 'rb') as f:
+        if header:
+            position += len(f.readline())
+        for line in f:
+            doc_id = line.split(b'\t', 1)[0].decode('utf-8').strip('\r\n')
+            if doc_id != current_id:
+                if current_id:
+                    index.setdefault(current_id, []).append((start, position))
+                current_id = doc_id
+                start = position
+            position += len(line)
+    if current_id:
+        index.setdefault(current_id, []).append((start, position))
+    return index
+
+
+def save_tokens_index(index, index_path):
+    """
+    Saves the index of documents in a text file: doc_id, start and end of a range per line.
+
+    Args:
+        index (dict) — index of documents, see build_tokens_index()
+        index_path (str) — path for a file
+    Returns:
+        none
+    """
+    with open(index_path, 'w', encoding='utf-8') as f:
+        for doc_id in index:
+            for start, end in index[doc_id]:
+                f.write('{0}\t{1}\t{2}\n'.format(doc_id, start, end))
+
+
+def read_tokens_index(index_path):
+    """
+    Reads the index of documents saved by save_tokens_index().
+
+    Args:
+        index_path (str) — path to the index file
+    Returns:
+        index (dict) — index of documents, see build_tokens_index()
+    """
+    index = {}
+    with open(index_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            doc_id, start, end = line.strip('\n').split('\t')
+            index.setdefault(doc_id, []).append((int(start), int(end)))
+    return index
+
+
+def load_tokens_index(tokens_path, header=True):
+    """
+    Gives the index of documents for the file with RuCor tokens. The index is built
+    only if there is no index file yet or if the tokens file is newer than it.
+
+    Args:
+        tokens_path (str) — path to the file with RuCor tokens
+        header (bool) — whether there is any header in the file
+    Returns:
+        index (dict) — index of documents, see build_tokens_index()
+    """
+    index_path = index_path_for(tokens_path)
+    if os.path.exists(index_path) and os.path.getmtime(index_path) >= os.path.getmtime(tokens_path):
+        return read_tokens_index(index_path)
+    index = build_tokens_index(tokens_path, header)
+    save_tokens_index(index, index_path)
+    return index
+
+
+def read_document(tokens_path, index, doc_id):
+    """
+    Reads lines of a single document from the file with RuCor tokens.
+
+    Args:
+        tokens_path (str) — path to the file with RuCor tokens
+        index (dict) — index of documents, see build_tokens_index()
+        doc_id (str) — id of a given document
+    Returns:
+        data (list of strs) — lines of the document (all empty lines omitted)
+    """
+    data = []
+    with open(tokens_path, 'rb') as f:
+        for start, end in index.get(doc_id, []):
+            f.seek(start)
+            chunk = f.read(end - start).decode('utf-8')
+            lines = (line.rstrip('\r') for line in chunk.split('\n'))
+            data.extend(line for line in lines if line != '')
+    return data
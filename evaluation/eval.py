@@ -1,4 +1,5 @@
 import numpy
+from scipy import sparse
 
 
 class Bcubed:
@@ -32,4 +33,79 @@ class Bcubed:
         Computes overall extended BCubed recall for the C and L dicts.
         """
         return numpy.mean([numpy.mean([self.mult_recall(el1, el2) \
-            for el2 in self.cdict if self.ldict[el1] & self.ldict[el2]]) for el1 in self.cdict])
\ No newline at end of file
+            for el2 in self.cdict if self.ldict[el1] & self.ldict[el2]]) for el1 in self.cdict])
+
+
+def incidence_matrix(memberships, elements):
+    """
+    Encodes memberships of elements as a sparse incidence matrix.
+
+    Args:
+        memberships (dict): {element: set of clusters (or labels)}
+        elements (list): elements in the order of the matrix rows
+    Returns:
+        matrix (scipy.sparse.csr_matrix): rows are elements, columns are clusters (or labels),
+            1 if the element belongs to the cluster
+    """
+    columns = {}
+    rows = []
+    cols = []
+    for row, element in enumerate(elements):
+        for cluster in memberships[element]:
+            rows.append(row)
+            cols.append(columns.setdefault(cluster, len(columns)))
+    data = numpy.ones(len(rows), dtype=numpy.float64)
+    return sparse.csr_matrix((data, (rows, cols)), shape=(len(elements), len(columns)))
+
+
+class SparseBcubed:
+    """
+    Extended BCubed, computed with sparse matrix products instead of pairwise set intersections.
+    Gives the same results as Bcubed.
+    """
+    def __init__(self, cdict, ldict):
+        self.cdict = cdict
+        self.ldict = ldict
+        elements = list(cdict)
+        clusters = incidence_matrix(cdict, elements)
+        labels = incidence_matrix(ldict, elements)
+        # shared clusters and shared labels of every pair of elements
+        self.shared_clusters = (clusters @ clusters.T).tocsr()
+        self.shared_labels = (labels @ labels.T).tocsr()
+        self.shared_clusters.eliminate_zeros()
+        self.shared_labels.eliminate_zeros()
+        self.shared_min = self.shared_clusters.minimum(self.shared_labels).tocsr()
+
+    def element_averages(self, shared):
+        """
+        Averages min(shared clusters, shared labels) / shared over the pairs with non-zero shared
+        for every element.
+        """
+        ratios = self.shared_min.multiply(shared.power(-1)).tocsr()
+        sums = numpy.asarray(ratios.sum(axis=1)).ravel()
+        counts = shared.getnnz(axis=1)
+        return sums / counts
+
+    def element_precisions(self):
+        """
+        Computes extended BCubed precision for every element, in the order of the C dict.
+        """
+        return self.element_averages(self.shared_clusters)
+
+    def element_recalls(self):
+        """
+        Computes extended BCubed recall for every element, in the order of the C dict.
+        """
+        return self.element_averages(self.shared_labels)
+
+    def precision(self):
+        """
+        Computes overall extended BCubed precision for the C and L dicts.
+        """
+        return numpy.mean(self.element_precisions())
+
+    def recall(self):
+        """
+        Computes overall extended BCubed recall for the C and L dicts.
+        """
+        return numpy.mean(self.element_recalls())
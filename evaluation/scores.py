@@ -0,0 +1,335 @@
+import json
+import numpy
+from scipy.optimize import linear_sum_assignment
+from eval import SparseBcubed
+
+
+METRICS = ["muc", "bcub", "ceafe", "blanc_coref", "blanc_noncoref"]
+
+
+def chains_to_clusters(chains):
+    """
+    Turns chains produced by markup/assemble_corpus_morph.py (parse_rdf(), nice_ids()) into clusters
+    of mentions. Mentions are identified by their offsets, so that key and response can be compared.
+
+    Args:
+        chains (dict): {chain_id (str): [(mention_start (int), mention_end (int), mention_id (str))]}
+    Returns:
+        clusters (list of sets): mentions of every chain, each mention is (start, end)
+    """
+    return [set((mention[0], mention[1]) for mention in chains[chain_id]) for chain_id in chains]
+
+
+def read_clusters(path):
+    """
+    Reads clusters of mentions from a file saved by markup/assemble_corpus_morph.py.
+    A mention spans from the start of its first token to the end of its last token.
+
+    Args:
+        path (str): path to the file
+    Returns:
+        clusters (list of sets): mentions of every chain, each mention is (start, end)
+    """
+    spans = {}
+    mention_chains = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            items = line.strip("\r\n").split("\t")
+            if len(items) < 8 or items[6] == "-":
+                continue
+            start = int(items[1])
+            end = start + int(items[2])
+            for chain_id, mention_id in zip(items[6].split(","), items[7].split(",")):
+                if mention_id in spans:
+                    spans[mention_id] = (min(spans[mention_id][0], start), max(spans[mention_id][1], end))
+                else:
+                    spans[mention_id] = (start, end)
+                mention_chains.setdefault(chain_id, set()).add(mention_id)
+    return [set(spans[mention_id] for mention_id in mention_chains[chain_id]) for chain_id in mention_chains]
+
+
+def cluster_index(clusters):
+    """
+    Maps every mention to the number of its cluster.
+
+    Args:
+        clusters (list of sets): clusters of mentions
+    Returns:
+        index (dict): {mention: cluster number (int)}
+    """
+    index = {}
+    for number, cluster in enumerate(clusters):
+        for mention in cluster:
+            index[mention] = number
+    return index
+
+
+def overlaps(key, response):
+    """
+    Counts common mentions of every pair of key and response clusters.
+
+    Args:
+        key (list of sets): gold clusters of mentions
+        response (list of sets): predicted clusters of mentions
+    Returns:
+        common (dict): {(key cluster number, response cluster number): number of common mentions}
+    """
+    response_index = cluster_index(response)
+    common = {}
+    for i, cluster in enumerate(key):
+        for mention in cluster:
+            if mention in response_index:
+                pair = (i, response_index[mention])
+                common[pair] = common.get(pair, 0) + 1
+    return common
+
+
+def pairs_count(n):
+    return n * (n - 1) // 2
+
+
+def statistics(key, response):
+    """
+    Computes numerators and denominators of recall and precision of all the metrics at once.
+    Statistics of several documents can be summed up to score the whole corpus.
+
+    Args:
+        key (list of sets): gold clusters of mentions
+        response (list of sets): predicted clusters of mentions
+    Returns:
+        stats (dict): {metric (str): numpy.ndarray [recall numerator, recall denominator,
+            precision numerator, precision denominator]}, metrics are listed in METRICS;
+            "blanc_counts" are totals for BLANC non-coreference links, see blanc_noncoref()
+    """
+    key = [set(cluster) for cluster in key if cluster]
+    response = [set(cluster) for cluster in response if cluster]
+    common = overlaps(key, response)
+    key_sizes = numpy.array([len(cluster) for cluster in key], dtype=numpy.int64)
+    response_sizes = numpy.array([len(cluster) for cluster in response], dtype=numpy.int64)
+    key_common = numpy.zeros(len(key), dtype=numpy.int64)
+    response_common = numpy.zeros(len(response), dtype=numpy.int64)
+    key_partitions = numpy.zeros(len(key), dtype=numpy.int64)
+    response_partitions = numpy.zeros(len(response), dtype=numpy.int64)
+    bcub_recall = 0.0
+    bcub_precision = 0.0
+    similarity = numpy.zeros((len(key), len(response)))
+    common_links = 0
+    for (i, j), n in common.items():
+        key_common[i] += n
+        response_common[j] += n
+        key_partitions[i] += 1
+        response_partitions[j] += 1
+        bcub_recall += n * n / key_sizes[i]
+        bcub_precision += n * n / response_sizes[j]
+        similarity[i, j] = 2 * n / (key_sizes[i] + response_sizes[j])
+        common_links += pairs_count(n)
+
+    stats = {}
+    # MUC: mentions missing in the other markup are separate partitions
+    key_partitions += key_sizes - key_common
+    response_partitions += response_sizes - response_common
+    stats["muc"] = numpy.array([(key_sizes - key_partitions).sum(), (key_sizes - 1).sum(),
+                                (response_sizes - response_partitions).sum(), (response_sizes - 1).sum()],
+                               dtype=numpy.float64)
+    # B-Cubed
+    stats["bcub"] = numpy.array([bcub_recall, key_sizes.sum(), bcub_precision, response_sizes.sum()],
+                                dtype=numpy.float64)
+    # CEAF-e: optimal alignment of entities
+    rows, columns = linear_sum_assignment(similarity, maximize=True)
+    aligned = similarity[rows, columns].sum()
+    stats["ceafe"] = numpy.array([aligned, len(key), aligned, len(response)], dtype=numpy.float64)
+    # BLANC: coreference and non-coreference links
+    key_links = sum(pairs_count(size) for size in key_sizes)
+    response_links = sum(pairs_count(size) for size in response_sizes)
+    stats["blanc_coref"] = numpy.array([common_links, key_links, common_links, response_links],
+                                       dtype=numpy.float64)
+    # non-coreference links are counted from totals, so that they include links between documents
+    # when statistics of several documents are summed up, see blanc_noncoref()
+    stats["blanc_counts"] = numpy.array([key_sizes.sum(), response_sizes.sum(), key_common.sum(), key_links,
+                                         response_links, sum(pairs_count(n) for n in key_common),
+                                         sum(pairs_count(n) for n in response_common), common_links],
+                                        dtype=numpy.float64)
+    stats["blanc_noncoref"] = blanc_noncoref(stats["blanc_counts"])
+    return stats
+
+
+def blanc_noncoref(counts):
+    """
+    Computes statistics of BLANC non-coreference links from mention and link totals.
+
+    Args:
+        counts (numpy.ndarray): [key mentions, response mentions, common mentions, key links,
+            response links, key links of common mentions, response links of common mentions, common links]
+    Returns:
+        stats (numpy.ndarray): [recall numerator, recall denominator, precision numerator, precision denominator]
+    """
+    key_mentions, response_mentions, common_mentions, key_links, response_links, \
+        key_common_links, response_common_links, common_links = counts
+    key_non_links = pairs_count(key_mentions) - key_links
+    response_non_links = pairs_count(response_mentions) - response_links
+    common_non_links = pairs_count(common_mentions) - key_common_links - response_common_links + common_links
+    return numpy.array([common_non_links, key_non_links, common_non_links, response_non_links], dtype=numpy.float64)
+
+
+def divide(numerator, denominator):
+    return numerator / denominator if denominator else 0.0
+
+
+def f1(recall, precision):
+    return divide(2 * recall * precision, recall + precision)
+
+
+def scores(stats):
+    """
+    Turns statistics into recall, precision and F1 of every metric, plus BLANC and CoNLL average.
+
+    Args:
+        stats (dict): see statistics()
+    Returns:
+        result (dict): {metric (str): (recall, precision, f1)}, "conll" is F1 only
+    """
+    result = {}
+    if "blanc_counts" in stats:
+        stats = dict(stats, blanc_noncoref=blanc_noncoref(stats["blanc_counts"]))
+    for metric in METRICS:
+        r_num, r_den, p_num, p_den = stats[metric]
+        recall = divide(r_num, r_den)
+        precision = divide(p_num, p_den)
+        result[metric] = (recall, precision, f1(recall, precision))
+    result["blanc"] = tuple((result["blanc_coref"][k] + result["blanc_noncoref"][k]) / 2 for k in range(3))
+    result["conll"] = (result["muc"][2] + result["bcub"][2] + result["ceafe"][2]) / 3
+    return result
+
+
+def evaluate(key, response):
+    """
+    Scores predicted clusters against gold ones with MUC, B-Cubed, CEAF-e, BLANC and CoNLL average.
+
+    Args:
+        key (list of sets): gold clusters of mentions
+        response (list of sets): predicted clusters of mentions
+    Returns:
+        result (dict): see scores()
+    """
+    return scores(statistics(key, response))
+
+
+def memberships(clusters):
+    """
+    Maps every mention to the numbers of all the clusters it belongs to.
+
+    Args:
+        clusters (list of sets): clusters of mentions
+    Returns:
+        mention_clusters (dict): {mention: set of cluster numbers (ints)}
+    """
+    mention_clusters = {}
+    for number, cluster in enumerate(clusters):
+        for mention in cluster:
+            mention_clusters.setdefault(mention, set()).add(number)
+    return mention_clusters
+
+
+def bcubed_statistics(key, response):
+    """
+    Computes sums of extended BCubed (see eval.Bcubed) recall and precision over the mentions
+    present both in key and response, so that they can be summed up over documents.
+
+    Args:
+        key (list of sets): gold clusters of mentions (L dict)
+        response (list of sets): predicted clusters of mentions (C dict)
+    Returns:
+        stats (numpy.ndarray): [sum of recalls, number of mentions, sum of precisions, number of mentions]
+    """
+    labels = memberships(key)
+    clusters = memberships(response)
+    common = [mention for mention in clusters if mention in labels]
+    if not common:
+        return numpy.zeros(4)
+    bcubed = SparseBcubed({mention: clusters[mention] for mention in common},
+                          {mention: labels[mention] for mention in common})
+    return numpy.array([bcubed.element_recalls().sum(), len(common),
+                        bcubed.element_precisions().sum(), len(common)])
+
+
+class Evaluator:
+    """
+    Scores a corpus document by document. Only numerators and denominators of every metric
+    are kept, so documents can be read from a generator and partial results of several
+    workers can be merged. Scores are the same as for the whole corpus scored at once with
+    mentions of different documents told apart: no cluster spans several documents, and
+    BLANC non-coreference links between documents are counted from mention totals.
+    """
+    def __init__(self, stats=None):
+        if stats is None:
+            stats = {metric: numpy.zeros(4) for metric in METRICS + ["ext_bcub"] if metric != "blanc_noncoref"}
+            stats["blanc_counts"] = numpy.zeros(8)
+        self.stats = stats
+        self.documents = 0
+
+    def add(self, key, response):
+        """
+        Adds statistics of a single document.
+
+        Args:
+            key (list of sets): gold clusters of mentions
+            response (list of sets): predicted clusters of mentions
+        """
+        stats = statistics(key, response)
+        stats["ext_bcub"] = bcubed_statistics(key, response)
+        # non-coreference links of the corpus are computed from blanc_counts
+        for metric in self.stats:
+            self.stats[metric] += stats[metric]
+        self.documents += 1
+
+    def add_documents(self, documents):
+        """
+        Adds statistics of documents one by one.
+
+        Args:
+            documents (iterable): (key, response) pairs, e.g. from a generator
+        Returns:
+            self (Evaluator)
+        """
+        for key, response in documents:
+            self.add(key, response)
+        return self
+
+    def merge(self, other):
+        """
+        Adds statistics collected by another evaluator (e.g. in another process).
+        """
+        for metric in other.stats:
+            self.stats[metric] += other.stats[metric]
+        self.documents += other.documents
+        return self
+
+    def scores(self):
+        """
+        Gives corpus-level scores, see scores(); "ext_bcub" is extended BCubed (see eval.Bcubed).
+        """
+        result = scores(self.stats)
+        r_num, r_den, p_num, p_den = self.stats["ext_bcub"]
+        recall = divide(r_num, r_den)
+        precision = divide(p_num, p_den)
+        result["ext_bcub"] = (recall, precision, f1(recall, precision))
+        return result
+
+    def save(self, path):
+        """
+        Saves statistics to a JSON file, e.g. to merge results computed on other machines.
+        """
+        data = {"documents": self.documents, "stats": {metric: self.stats[metric].tolist() for metric in self.stats}}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads statistics saved by save().
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        evaluator = cls({metric: numpy.array(data["stats"][metric]) for metric in data["stats"]})
+        evaluator.documents = data["documents"]
+        return evaluator
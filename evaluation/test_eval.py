@@ -0,0 +1,20 @@
+import random
+import pytest
+from eval import Bcubed, SparseBcubed
+
+
+def random_assignment(elements, labels, rng):
+    # every element belongs to one or more clusters
+    return {element: set(rng.sample(range(labels), rng.randint(1, min(3, labels)))) for element in elements}
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_sparse_bcubed_matches_bcubed(seed):
+    rng = random.Random(seed)
+    elements = list(range(rng.randint(1, 30)))
+    cdict = random_assignment(elements, rng.randint(1, 6), rng)
+    ldict = random_assignment(elements, rng.randint(1, 6), rng)
+    expected = Bcubed(cdict, ldict)
+    actual = SparseBcubed(cdict, ldict)
+    assert actual.precision() == pytest.approx(expected.precision())
+    assert actual.recall() == pytest.approx(expected.recall())
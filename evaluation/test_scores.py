@@ -0,0 +1,106 @@
+import pytest
+from scores import METRICS, Evaluator, evaluate
+
+
+def assert_zero(result):
+    for metric in METRICS + ["blanc"]:
+        assert result[metric] == (0.0, 0.0, 0.0)
+    assert result["conll"] == 0.0
+
+
+def test_empty_response():
+    assert_zero(evaluate([{1, 2}], []))
+
+
+def test_empty_key():
+    assert_zero(evaluate([], [{1, 2}]))
+
+
+def test_empty_key_and_response():
+    assert_zero(evaluate([], []))
+
+
+def test_evaluator_empty_document():
+    evaluator = Evaluator()
+    evaluator.add([{1, 2}], [])
+    evaluator.add([{1, 2}], [{1, 2}])
+    result = evaluator.scores()
+    assert evaluator.documents == 2
+    assert result["muc"] == (0.5, 1.0, 2 / 3)
+
+
+DOCUMENTS = [
+    ([{"a", "b", "c"}, {"d", "e"}], [{"a", "b"}, {"c", "d", "x"}]),
+    ([{"p", "q"}], [{"p", "q"}, {"r", "s"}]),
+    ([{"u", "v", "w"}], []),
+]
+
+
+def batch_scores(documents):
+    # mentions of different documents are told apart by the document number
+    key = [{(i, mention) for mention in cluster} for i, (clusters, _) in enumerate(documents) for cluster in clusters]
+    response = [{(i, mention) for mention in cluster} for i, (_, clusters) in enumerate(documents)
+                for cluster in clusters]
+    return evaluate(key, response)
+
+
+def assert_same_scores(actual, expected):
+    for metric in expected:
+        assert actual[metric] == pytest.approx(expected[metric])
+
+
+def test_streaming_equals_batch():
+    assert_same_scores(Evaluator().add_documents(iter(DOCUMENTS)).scores(), batch_scores(DOCUMENTS))
+
+
+def test_merge_equals_single_evaluator():
+    single = Evaluator().add_documents(DOCUMENTS)
+    merged = Evaluator().add_documents(DOCUMENTS[:1]).merge(Evaluator().add_documents(DOCUMENTS[1:]))
+    assert merged.documents == single.documents
+    assert_same_scores(merged.scores(), single.scores())
+
+
+def test_save_load_round_trip(tmp_path):
+    evaluator = Evaluator().add_documents(DOCUMENTS)
+    path = str(tmp_path / "stats.json")
+    evaluator.save(path)
+    loaded = Evaluator.load(path)
+    assert loaded.documents == evaluator.documents
+    assert_same_scores(loaded.scores(), evaluator.scores())
+
+
+KEY = [{"a", "b", "c"}, {"d", "e", "f", "g"}]
+RESPONSE = [{"a", "b"}, {"c", "d"}, {"f", "g", "h", "i"}]
+
+
+def assert_recall_precision(result, metric, recall, precision):
+    assert result[metric][0] == pytest.approx(recall)
+    assert result[metric][1] == pytest.approx(precision)
+
+
+def test_muc():
+    assert_recall_precision(evaluate(KEY, RESPONSE), "muc", 0.4, 0.4)
+
+
+def test_bcubed():
+    assert_recall_precision(evaluate(KEY, RESPONSE), "bcub", (4 / 3 + 1 / 3 + 1 / 4 + 1) / 7, 4 / 8)
+
+
+def test_ceafe():
+    assert_recall_precision(evaluate(KEY, RESPONSE), "ceafe", 0.65, 1.3 / 3)
+
+
+def test_blanc():
+    result = evaluate(KEY, RESPONSE)
+    assert_recall_precision(result, "blanc_coref", 2 / 9, 2 / 8)
+    assert_recall_precision(result, "blanc_noncoref", 8 / 12, 8 / 20)
+    assert_recall_precision(result, "blanc", (2 / 9 + 8 / 12) / 2, (2 / 8 + 8 / 20) / 2)
+
+
+def test_mention_missing_in_response():
+    result = evaluate([{"a", "b", "c"}], [{"a", "b"}])
+    assert_recall_precision(result, "muc", 0.5, 1.0)
+    assert_recall_precision(result, "bcub", 4 / 9, 1.0)
+    assert_recall_precision(result, "ceafe", 0.8, 0.8)
+    assert_recall_precision(result, "blanc_coref", 1 / 3, 1.0)
+    assert_recall_precision(result, "blanc_noncoref", 0.0, 0.0)
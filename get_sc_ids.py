@@ -1,45 +1,138 @@
+import argparse
+from collections import Counter
+from multiprocessing import Pool
 import os
+from atomic_writer import AtomicWriter
 
 
 def semclass_and_id(analysis):
-    sem_class = ''
-    sc_id = 0
     characteristics = analysis.split('\t')
     for charact in characteristics:
         if 'SC=' in charact:
             sem_char = charact.split('=')[1].split('(')
+            if len(sem_char) < 2:
+                return None
             sem_class = sem_char[0]
             sc_id = sem_char[1].strip(')')
             return sem_class, sc_id
+    return None
 
 
-def write_semclass(class_path, sc, sc_id):
-    if not os.path.exists(class_path):
-        with open(class_path, 'w', encoding='utf-8') as file_classes:
-            file_classes.write('{0}\t{1}'.format(sc_id, sc))
-    else:
-        with open(class_path, 'a', encoding='utf-8') as file_classes:
-            file_classes.write('\n{0}\t{1}'.format(sc_id, sc))
+def file_semclasses(path):
+    """
+    Counts occurrences of semantic classes in a file with NLC / ABBYY Compreno annotation.
+
+    Args:
+        path (str) — path to the file
+    Returns:
+        occurrences (Counter) — {(sc_id (str), sc (str)): number of tokens}
+    """
+    occurrences = Counter()
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            analysis = line.strip('\n')
+            if analysis == '':
+                continue
+            semclass = semclass_and_id(analysis)
+            if semclass is not None:
+                sc, sc_id = semclass
+                occurrences[(sc_id, sc)] += 1
+    return occurrences
+
+
+def semclass_dictionary(occurrences):
+    """
+    Turns occurrences of semantic classes into a dictionary. If an ID has several names,
+    the most frequent one is kept and the conflict is reported.
+
+    Args:
+        occurrences (Counter) — see file_semclasses()
+    Returns:
+        semclasses (dict) — {sc_id (str): sc (str)}
+        counts (Counter) — {sc_id (str): number of tokens}
+        conflicts (dict) — {sc_id (str): set of names (strs)}, IDs with more than one name
+    """
+    names = {}
+    counts = Counter()
+    for (sc_id, sc), count in occurrences.items():
+        names.setdefault(sc_id, Counter())[sc] += count
+        counts[sc_id] += count
+    semclasses = {}
+    conflicts = {}
+    for sc_id, sc_names in names.items():
+        semclasses[sc_id] = sc_names.most_common(1)[0][0]
+        if len(sc_names) > 1:
+            conflicts[sc_id] = set(sc_names)
+    return semclasses, counts, conflicts
+
+
+def sc_order(sc_id):
+    return (0, int(sc_id), '') if sc_id.isdigit() else (1, 0, sc_id)
+
+
+def write_semclasses(class_path, semclasses, counts=None):
+    """
+    Saves the dictionary sorted by ID: 'sc_id\tsc' per line, with the number of tokens
+    as the third column if counts are given.
+    """
+    with AtomicWriter(class_path) as file_classes:
+        for sc_id in sorted(semclasses, key=sc_order):
+            if counts is None:
+                file_classes.write('{0}\t{1}\n'.format(sc_id, semclasses[sc_id]))
+            else:
+                file_classes.write('{0}\t{1}\t{2}\n'.format(sc_id, semclasses[sc_id], counts[sc_id]))
 
 
-def main():
+def read_semclasses(class_path):
+    """
+    Reads the dictionary saved by write_semclasses().
+
+    Args:
+        class_path (str) — path to semclasses.txt
+    Returns:
+        semclasses (dict) — {sc_id (str): sc (str)}
+    """
+    semclasses = {}
+    with open(class_path, 'r', encoding='utf-8') as file_classes:
+        for line in file_classes:
+            items = line.strip('\r\n').split('\t')
+            if len(items) >= 2:
+                semclasses[items[0]] = items[1]
+    return semclasses
+
+
+def main(workers=1, counts=False):
     class_path = '..' + os.sep + 'newcorpus' + os.sep + 'NLC' + os.sep + 'semclasses.txt'
-    total = len(os.listdir('.' + os.sep + 'NLC'))
-    i = 1
-    for item in os.listdir('.' + os.sep + 'NLC'):
-        if item.endswith('.csv'):
-            path = '.' + os.sep + 'NLC' + os.sep + item
-            with open(path, 'r', encoding='utf-8') as file:
-                analyses = [line.strip('\n') for line in file.readlines() if line.strip('\n') != '']
-                for analysis in analyses:
-                    try:
-                        sc, sc_id = semclass_and_id(analysis)
-                        write_semclass(class_path, sc, sc_id)
-                    except:
-                        pass
-            print('{0:.2f}%, file name: {1}'.format(i/total*100, item))
-            i += 1
+    nlc_folder = '.' + os.sep + 'NLC'
+    paths = [nlc_folder + os.sep + item for item in sorted(os.listdir(nlc_folder)) if item.endswith('.csv')]
+    total = len(paths)
+
+    if workers > 1:
+        pool = Pool(workers)
+        done = pool.imap_unordered(file_semclasses, paths)
+    else:
+        done = map(file_semclasses, paths)
+
+    occurrences = Counter()
+    for i, file_occurrences in enumerate(done, start=1):
+        occurrences.update(file_occurrences)
+        print('{0:.2f}%, files: {1}/{2}'.format(i/total*100, i, total))
+
+    if workers > 1:
+        pool.close()
+        pool.join()
+
+    semclasses, sc_counts, conflicts = semclass_dictionary(occurrences)
+    for sc_id in sorted(conflicts, key=sc_order):
+        print('conflict: id {0} has names {1}, kept {2}'.format(sc_id, ', '.join(sorted(conflicts[sc_id])),
+                                                                semclasses[sc_id]))
+    write_semclasses(class_path, semclasses, sc_counts if counts else None)
+    print('{0} semantic classes saved to {1}'.format(len(semclasses), class_path))
 
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=1, help='number of worker processes')
+    parser.add_argument('--counts', action='store_true', help='save number of tokens of every semantic class')
+    args = parser.parse_args()
+    main(workers=args.workers, counts=args.counts)
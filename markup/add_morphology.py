@@ -1,43 +1,198 @@
+import argparse
+import heapq
+from multiprocessing import Pool
 from pymorphy2 import tokenizers
-from pymorphy2 import MorphAnalyzer
 import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from atomic_writer import AtomicWriter
+from morph_cache import morph_cache
 
 
-def morphology_features(tokens, morph):
-    new_tokens = []
-    for token in tokens:
-        analysis = str(morph.parse(token)[0].tag)
-        new_tokens.append(token + '\t' + analysis)
-    return new_tokens
+class TagVocabulary:
+    """
+    Morphological tags shared by all the parsed files: each tag is written to the files
+    as its number (code), tags themselves are saved once to a separate file.
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.tags = []
+        self.codes = {}
+        if path is not None and os.path.exists(path):
+            self.load()
 
+    def code(self, tag):
+        if tag not in self.codes:
+            self.codes[tag] = len(self.tags)
+            self.tags.append(tag)
+        return self.codes[tag]
 
-def write_info(tokens, path, fname):
-    for i in range(len(tokens)):
-        tokens[i] = str(i+1) + '\t' + tokens[i]
-    path = path.replace('rucoref_texts', 'rucoref_new_parsed')
+    def load(self):
+        """
+        Reads tags saved by save(): code and tag per line, separated by a tab.
+        """
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                items = line.rstrip('\n').split('\t')
+                if len(items) == 2:
+                    self.codes[items[1]] = int(items[0])
+        self.tags = sorted(self.codes, key=self.codes.get)
+
+    def save(self):
+        with AtomicWriter(self.path) as f:
+            for code, tag in enumerate(self.tags):
+                f.write('{0}\t{1}\n'.format(code, tag))
+
+
+def wordform_tags(tokens, morph):
+    """
+    Parses every distinct wordform of a text once.
+
+    Args:
+        tokens (list of strs) — tokens of a text
+        morph (MorphCache) — morphological analyzer
+    Returns:
+        tags (dict) — {wordform (str): tag (str)}
+    """
+    return {wordform: morph.parse(wordform)[1] for wordform in set(tokens)}
+
+
+def token_codes(tokens, tags, vocabulary):
+    wordform_codes = {wordform: vocabulary.code(tags[wordform]) for wordform in tags}
+    return [wordform_codes[token] for token in tokens]
+
+
+def tag_codes(tokens, morph, vocabulary):
+    """
+    Tags tokens of a text, every distinct wordform is parsed only once.
+
+    Args:
+        tokens (list of strs) — tokens of a text
+        morph (MorphCache) — morphological analyzer
+        vocabulary (TagVocabulary) — tags and their codes, new tags are added
+    Returns:
+        codes (list of ints) — code of the tag of every token
+    """
+    return token_codes(tokens, wordform_tags(tokens, morph), vocabulary)
+
+
+def parsed_path(path):
+    return path.replace('rucoref_texts', 'rucoref_new_parsed')
+
+
+def write_info(tokens, codes, path, fname):
+    path = parsed_path(path)
     if not os.path.exists(path):
         os.makedirs(path)
     fpath = path + os.sep + fname
-    with open(fpath, 'w', encoding='utf-8') as new_file:
-        new_file.write('\n'.join(tokens))
+    # number, token and tag code per line
+    lines = ('{0}\t{1}\t{2}'.format(i, token, code) for i, (token, code) in enumerate(zip(tokens, codes), start=1))
+    with AtomicWriter(fpath) as new_file:
+        new_file.write('\n'.join(lines))
 
 
-def main():
-    morph = MorphAnalyzer()
-    texts_path = '..' + os.sep + '..' + os.sep + '..' + os.sep + '..' + os.sep + 'RuCoref' + os.sep + 'rucoref_texts'
+def text_files(texts_path):
+    """
+    Finds texts which haven't been parsed yet or have changed since they were parsed.
+
+    Args:
+        texts_path (str) — path to rucoref_texts
+    Returns:
+        files (list of tuples) — (text folder (str), file name (str), size (int))
+    """
+    files = []
     for folder in os.listdir(texts_path):
         text_folder = texts_path + os.sep + folder
         for filename in os.listdir(text_folder):
             if filename.endswith('.txt'):
-                with open(text_folder + os.sep + filename, 'r', encoding='utf-8') as source_file:
-                    source_text = source_file.read()
-                    # get tokens
-                    tokens = tokenizers.simple_word_tokenize(source_text)
-                    # parse tokens
-                    tokens_with_tags = morphology_features(tokens, morph)
-                    # write tokens to new file
-                    write_info(tokens_with_tags, text_folder, filename)
+                source = text_folder + os.sep + filename
+                parsed = parsed_path(text_folder) + os.sep + filename
+                if os.path.exists(parsed) and os.path.getmtime(parsed) > os.path.getmtime(source):
+                    continue
+                files.append((text_folder, filename, os.path.getsize(source)))
+    return files
+
+
+def balanced_chunks(files, chunks_number):
+    """
+    Splits files into chunks of about the same total size: the largest files go first,
+    each to the chunk which is the smallest at the moment.
+
+    Args:
+        files (list of tuples) — see text_files()
+        chunks_number (int) — number of chunks
+    Returns:
+        chunks (list of lists) — (text folder, file name) of files of every chunk
+    """
+    chunks = [[] for _ in range(min(chunks_number, len(files)))]
+    sizes = [(0, i) for i in range(len(chunks))]
+    for text_folder, filename, size in sorted(files, key=lambda file: file[2], reverse=True):
+        total, i = heapq.heappop(sizes)
+        chunks[i].append((text_folder, filename))
+        heapq.heappush(sizes, (total + size, i))
+    return chunks
+
+
+def init_worker():
+    # the analyzer is loaded once per worker process
+    morph_cache()
+
+
+def parse_chunk(chunk):
+    """
+    Tokenizes and parses texts of a chunk.
+
+    Args:
+        chunk (list of tuples) — (text folder (str), file name (str))
+    Returns:
+        parsed (list of tuples) — (text folder, file name, tokens (list of strs), tags (dict)),
+            see wordform_tags()
+    """
+    morph = morph_cache()
+    parsed = []
+    for text_folder, filename in chunk:
+        with open(text_folder + os.sep + filename, 'r', encoding='utf-8') as source_file:
+            source_text = source_file.read()
+        # get tokens
+        tokens = tokenizers.simple_word_tokenize(source_text)
+        # parse tokens
+        parsed.append((text_folder, filename, tokens, wordform_tags(tokens, morph)))
+    return parsed
+
+
+def main(workers=1, chunks_per_worker=4):
+    texts_path = '..' + os.sep + '..' + os.sep + '..' + os.sep + '..' + os.sep + 'RuCoref' + os.sep + 'rucoref_texts'
+    if not os.path.exists(parsed_path(texts_path)):
+        os.makedirs(parsed_path(texts_path))
+    vocabulary = TagVocabulary(parsed_path(texts_path) + os.sep + 'tags.txt')
+    files = text_files(texts_path)
+    print('{} files to parse'.format(len(files)))
+    if workers > 1:
+        pool = Pool(workers, initializer=init_worker)
+        done = pool.imap_unordered(parse_chunk, balanced_chunks(files, workers * chunks_per_worker))
+    else:
+        done = map(parse_chunk, [[(text_folder, filename)] for text_folder, filename, _ in files])
+    # codes of tags are given here, so that they are the same for all the workers
+    for parsed in done:
+        for text_folder, filename, tokens, tags in parsed:
+            known_tags = len(vocabulary.tags)
+            codes = token_codes(tokens, tags, vocabulary)
+            # new codes are saved before a file with them appears, so that after an interruption
+            # every parsed file (skipped next time) can be decoded
+            if len(vocabulary.tags) > known_tags:
+                vocabulary.save()
+            # write tokens to new file
+            write_info(tokens, codes, text_folder, filename)
+    vocabulary.save()
+    if workers > 1:
+        pool.close()
+        pool.join()
+    else:
+        # in parallel mode every worker has its own cache of parses, it isn't saved
+        morph_cache().save()
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=1, help='number of worker processes')
+    main(workers=parser.parse_args().workers)
@@ -1,4 +1,9 @@
+from bisect import bisect_left
 import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from morph_cache import morph_cache
+from rdf_reader import iter_mentions
 
 
 def read_tokens_info(path):
@@ -34,26 +39,11 @@ def parse_rdf(rdf_path):
         mentions (dict): dictionary with mentions and their IDs:
         [(start_offset, end_offset): "id"]
     """
-    from lxml import etree
-
     mentions = {}
-    tree = etree.parse(rdf_path)
-    root = tree.getroot()
-    # AuxAnnotations
-    for aux_annotation in root[-1].getchildren():
-        # Aux:InstanceAnnotations
-        for instance_annotation in aux_annotation.getchildren():
-            mention_id = instance_annotation.attrib.values()[0]
-            for child in instance_annotation.getchildren():
-                if "annotation_start" in child.tag:
-                    mention_start = child.text
-                if "annotation_end" in child.tag:
-                    mention_end = child.text
-                if "instance" in child.tag:
-                    chain_id = child.attrib.values()[0]
-            if chain_id not in mentions:
-                mentions[chain_id] = []
-            mentions[chain_id].append((int(mention_start), int(mention_end), mention_id))
+    for chain_id, mention_start, mention_end, mention_id in iter_mentions(rdf_path):
+        if chain_id not in mentions:
+            mentions[chain_id] = []
+        mentions[chain_id].append((mention_start, mention_end, mention_id))
     return mentions
 
 
@@ -113,18 +103,23 @@ def align(chains, text):
             mention_id (str), chain_id (str)]
             - if no mentions and chains, they are set to "-"
     """
+    # tokens sorted by start, so that tokens of a mention are found by bisection
+    tokens = sorted([item for item in text if type(item) == list], key=lambda item: item[1])
+    starts = [item[1] for item in tokens]
     for entity in chains:
         mentions = chains[entity]
         for mention in mentions:
-            for item in text:
-                if type(item) == list:
-                    if item[1] >= mention[0] and item[1] + item[2] <= mention[1]:
-                        if len(item) == 4:
-                            item.append(entity)
-                            item.append(mention[2])
-                        else:
-                            item[4] = item[4] + "," + entity
-                            item[5] = item[5] + "," + mention[2]
+            i = bisect_left(starts, mention[0])
+            while i < len(tokens) and starts[i] <= mention[1]:
+                item = tokens[i]
+                if item[1] + item[2] <= mention[1]:
+                    if len(item) == 4:
+                        item.append(entity)
+                        item.append(mention[2])
+                    else:
+                        item[4] = item[4] + "," + entity
+                        item[5] = item[5] + "," + mention[2]
+                i += 1
     for item in text:
         if type(item) == list and len(item) == 4:
             item += ["-", "-"]
@@ -144,16 +139,13 @@ def add_morph(text):
             [token_id (str), start (int), len (int), token (str), lemma (str),
             morphology (str), mention_id (str), chain_id (str)]
     """
-    import pymorphy2
-
-    morph = pymorphy2.MorphAnalyzer()
+    morph = morph_cache()
     for item in text:
         if type(item) == list:
             wordform = item[3]
-            lemma = morph.parse(wordform)[0].normal_form
-            morphology = morph.parse(wordform)[0].tag
+            lemma, morphology = morph.parse(wordform)
             item.insert(4, lemma)
-            item.insert(5, str(morphology))
+            item.insert(5, morphology)
     return text
 
 
@@ -211,6 +203,7 @@ def main():
         except:
             pass
         counter += 1
+    morph_cache().save()
 
 
 if __name__ == "__main__":
@@ -1,5 +1,27 @@
+import json
+import numpy as np
 import os
-import re
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from atomic_writer import AtomicWriter
+from nlc_records import parse_record
+
+
+EMPTY_MANIFEST = "empty_books.json"
+
+# columns of an NLC table, see parse_nlc()
+NLC_COLUMNS = ["offset", "parent_offset", "semantic_class", "syntax_paradigm"]
+# absent value in an NLC table; real values may be negative (the parent offset of the root is -1)
+NA = np.iinfo(np.int64).min
+
+
+def is_align_line(line):
+    return line.strip("\r\n") != ""
+
+
+def is_nlc_line(line):
+    # shorter lines are empty or broken, they contain no analysis
+    return len(line) > 2
 
 
 def get_align(path):
@@ -17,6 +39,8 @@ def get_align(path):
     alignment = {}
     with open(path, "r", encoding="utf-8") as f:
         for line in f.readlines():
+            if not is_align_line(line):
+                continue
             token, oc_offset, nlc_offset = line.strip("\r\n").split("\t")
             oc_offset = int(oc_offset)
             nlc_offset = [int(offset) for offset in nlc_offset.split(", ")]
@@ -24,67 +48,53 @@ def get_align(path):
     return alignment
 
 
-def find_feature_value(feature, feature_list):
-    """
-    Finds a value of a given feature.
-
-    Args:
-        feature (str): feature we're interested in
-        feature_list (list of strs): list of strs which may contain the feature
-
-    Returns:
-         value (str): value of the feature (if feature is present) or 'NA'
-    """
-    found = False
-    i = 0
-    while not found and i < len(feature_list):
-        if feature in feature_list[i]:
-            found = True
-            value = feature_list[i].split('=')[1]
-            if feature != "Text":
-                value = re.sub("\D", "", value)
-        else:
-            i += 1
-    if not found:
-        value = "NA"
-    return value
+def nlc_id(value):
+    return NA if value == "NA" else int(value)
 
 
 def parse_nlc(path):
     """
-    Opens a file with NLC analyses and turns it into a machine-readable
-    dictionary.
+    Opens a file with NLC analyses and turns it into a table of integers sorted by offset.
 
     Args:
         path (str): path to file.
     Returns:
-        nlc_tokens (dict): dictionary containing semantic and syntactic
-        information about tokens, where
-            key = offset in NLC (int)
-            value = [semantic_class(str), syntax_paradigm(str)]
+        nlc_table (dict): semantic and syntactic information about tokens, parallel arrays
+            (numpy.ndarray of ints), absent values are NA (the least int64):
+            "offset" = offset in NLC, sorted, unique
+            "parent_offset" = offset of the parent token
+            "semantic_class" = semantic class ID
+            "syntax_paradigm" = syntax paradigm ID
     """
-    nlc_tokens = {}
+    columns = {column: [] for column in NLC_COLUMNS}
     with open(path, "r", encoding="utf-8") as nlc_file:
-        raw_tokens = [line for line in nlc_file.readlines() if len(line) > 2]
-    for raw_token in raw_tokens:
-        items = raw_token.strip("\n").split("\t")
-        offset = find_feature_value("Offset", items)
-        offset = int(offset)
-        semantic = find_feature_value("SC", items)
-        syntax = find_feature_value("SP", items)
-        parent_offset = find_feature_value("ParentOffset", items)
-        nlc_tokens[offset] = [parent_offset, semantic, syntax]
-    return nlc_tokens
+        for raw_token in nlc_file:
+            if is_nlc_line(raw_token):
+                record = parse_record(raw_token, default="NA")
+                for column in NLC_COLUMNS:
+                    columns[column].append(nlc_id(record[column]))
+    nlc_table = {column: np.array(columns[column], dtype=np.int64) for column in NLC_COLUMNS}
+    if len(nlc_table["offset"]) == 0:
+        return nlc_table
+    # if an offset is repeated, its last analysis is kept
+    order = np.argsort(nlc_table["offset"], kind="stable")
+    offsets = nlc_table["offset"][order]
+    last = np.append(offsets[1:] != offsets[:-1], True)
+    return {column: nlc_table[column][order][last] for column in NLC_COLUMNS}
+
 
+def id_strings(ids):
+    return np.where(ids == NA, "NA", ids.astype(str))
 
-def align_oc_nlc(alignments, nlc_info):
+
+def align_oc_nlc(alignments, nlc_table):
     """
     Inserts semantic and syntactic information, using OpenCorpora offsets.
 
     Args:
         alignments (dict): dictionary with alignment between OpenCorpora
             and NLC
-        nlc_info (dict): dictionaty with information from NLC
+        nlc_table (dict): table with information from NLC, see parse_nlc()
     Returns:
         ready_list (list of strs): list with information to be saved
             - opencorpora offset
@@ -92,15 +102,31 @@ def align_oc_nlc(alignments, nlc_info):
             - token parent's offset
             - semantic class ID
             - syntax paradigm ID
+        missing (list of ints): NLC offsets from the alignment which are absent in NLC analyses
     """
-    ready_info = []
+    oc_offsets = []
+    tokens = []
+    nlc_offsets = []
     for oc_offset in alignments:
-        token, nlc_offsets = alignments[oc_offset]
-        for nlc_offset in nlc_offsets:
-            po, sem, synt = nlc_info[nlc_offset]
-            info = "{}\t{}\t{}\t{}\t{}".format(oc_offset, token, po, sem, synt)
-            ready_info.append(info)
-    return ready_info
+        token, token_nlc_offsets = alignments[oc_offset]
+        for nlc_offset in token_nlc_offsets:
+            oc_offsets.append(oc_offset)
+            tokens.append(token)
+            nlc_offsets.append(nlc_offset)
+    nlc_offsets = np.array(nlc_offsets, dtype=np.int64)
+    # rows of the table with the same offsets
+    rows = np.searchsorted(nlc_table["offset"], nlc_offsets)
+    found = rows < len(nlc_table["offset"])
+    found[found] = nlc_table["offset"][rows[found]] == nlc_offsets[found]
+    missing = nlc_offsets[~found].tolist()
+    rows = rows[found]
+    po = id_strings(nlc_table["parent_offset"][rows])
+    sem = id_strings(nlc_table["semantic_class"][rows])
+    synt = id_strings(nlc_table["syntax_paradigm"][rows])
+    found_indices = np.flatnonzero(found)
+    ready_info = ["{}\t{}\t{}\t{}\t{}".format(oc_offsets[i], tokens[i], po[k], sem[k], synt[k])
+                  for k, i in enumerate(found_indices)]
+    return ready_info, missing
 
 
 def save(info, path):
@@ -117,6 +143,93 @@ def save(info, path):
         f_save.write("\n".join(info))
 
 
+def file_state(path):
+    """
+    Gives modification time and size of a file.
+
+    Args:
+        path (str): path to file
+    Returns:
+        state (list or None): [mtime (float), size (int)], none if there is no such file
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_mtime, stat.st_size]
+
+
+def has_lines(path, is_line):
+    with open(path, "r", encoding="utf-8") as f:
+        return any(is_line(line) for line in f)
+
+
+def is_empty(align_path, nlc_path, states):
+    """
+    Tells whether a book can't be annotated: one of its files is missing or empty,
+    or there are no aligned tokens or no NLC analyses in it.
+
+    Args:
+        align_path (str): path to the alignment file
+        nlc_path (str): path to the NLC file
+        states (list): states of both files, see file_state()
+    Returns:
+        empty (bool)
+    """
+    if any(state is None or state[1] == 0 for state in states):
+        return True
+    # lines are checked by the same rules as in get_align() and parse_nlc()
+    return not (has_lines(align_path, is_align_line) and has_lines(nlc_path, is_nlc_line))
+
+
+def read_manifest(path):
+    """
+    Reads the manifest of books saved by save_manifest().
+
+    Args:
+        path (str): path to the manifest
+    Returns:
+        manifest (dict): {alignment file name (str): {"align": state, "nlc": state, "empty": bool}},
+            states are described in file_state()
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, path):
+    with AtomicWriter(path) as f:
+        f.write(json.dumps(manifest, ensure_ascii=False, indent=1, sort_keys=True))
+
+
+def empty_books(align_files, path_align, path_nlc, manifest):
+    """
+    Finds books which can't be annotated. Files of a book are opened only if they have
+    changed since the last run, otherwise the answer is taken from the manifest.
+
+    Args:
+        align_files (list of strs): names of alignment files
+        path_align (str): folder with alignment files
+        path_nlc (str): folder with NLC files
+        manifest (dict): see read_manifest(), updated in place
+    Returns:
+        empty (set of strs): names of alignment files of empty books
+    """
+    empty = set()
+    for file_align in align_files:
+        align_path = path_align + os.sep + file_align
+        nlc_path = path_nlc + os.sep + file_align.replace("txt", "csv")
+        states = [file_state(align_path), file_state(nlc_path)]
+        known = manifest.get(file_align)
+        if known is None or [known["align"], known["nlc"]] != states:
+            known = {"align": states[0], "nlc": states[1], "empty": is_empty(align_path, nlc_path, states)}
+            manifest[file_align] = known
+        if known["empty"]:
+            empty.add(file_align)
+    return empty
+
+
 def main():
     # align: book_2.txt, oc: book_2.tokens, nlc: books_2.csv
     path_align = ".." + os.sep + "!data" + os.sep + "newcorpus" + os.sep + "align"
@@ -126,24 +239,34 @@ def main():
     if not os.path.exists(path_save):
         os.mkdir(path_save)
 
-    align_files = [file for file in os.listdir(path_align) if not file.startswith("!")]
+    align_files = [file for file in os.listdir(path_align) if file.endswith(".txt") and not file.startswith("!")]
     total = len(align_files)
     counter = 1
 
-    empty = set([1541, 21, 50, 68, 79, 94, 123, 2176, 2178, 2185, 178, 2234, 2235, 2236, 2237, 2239, 2241, 2274, 2275, 2276, 2277, 2280, 2283, 2292, 2330, 3364, 2892, 2895, 4042, 4043, 4001, 418, 4002, 4003, 4004, 4005, 4006, 4007, 4008, 4009, 4010, 4011, 4012, 4013, 4014, 4015, 4016, 4017, 4018, 4019, 4020, 4021, 4022, 4024, 4023, 4025, 4026, 4027, 4029, 4030, 4031, 4032, 4033, 4034, 4035, 4036, 4028, 4037, 4038, 4040, 4041, 4039, 459, 4044, 4045, 4046, 4047, 4048, 4049, 4050, 3539, 4052, 4051, 4054, 4053, 4055, 4056, 4057, 4058, 4059, 3037, 4060, 4061, 4062])
+    # books with empty or missing files are found once and remembered in the manifest
+    manifest_path = path_save + os.sep + EMPTY_MANIFEST
+    manifest = read_manifest(manifest_path)
+    empty = empty_books(align_files, path_align, path_nlc, manifest)
+    save_manifest(manifest, manifest_path)
+    print("{} books, {} empty".format(total, len(empty)))
 
     for file_align in align_files:
-        if not int(re.search("[0-9]+", file_align).group(0)) in empty:
+        if file_align not in empty:
             alignment = get_align(path_align + os.sep + file_align)
             nlc = parse_nlc(path_nlc + os.sep + file_align.replace("txt", "csv"))
-            ready_info = align_oc_nlc(alignment, nlc)
+            ready_info, missing = align_oc_nlc(alignment, nlc)
             save(ready_info, path_save + os.sep + file_align)
+            if missing:
+                print("no NLC analyses for {} offsets in {}: {}".format(len(missing), file_align,
+                                                                        ", ".join(str(offset) for offset in missing[:10])))
             print("semantics/syntax done: {}/{}, {:2.2f}%, file: {}".format(counter, total,
                                                            counter / total * 100,
                                                            file_align))
         else:
-            os.remove(path_save + os.sep + file_align)
-            print("semantics/syntax REMOVED: {}/{}, {:2.2f}%, file: {}".format(
+            # a result of a previous run is stale now
+            if os.path.exists(path_save + os.sep + file_align):
+                os.remove(path_save + os.sep + file_align)
+            print("semantics/syntax SKIPPED (empty): {}/{}, {:2.2f}%, file: {}".format(
                 counter, total,
                 counter / total * 100,
                 file_align))
@@ -151,4 +274,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,5 +1,5 @@
 import os
-from lxml import etree
+from rdf_reader import iter_mentions
 
 
 def parse_rdf(rdf_path):
@@ -12,23 +12,10 @@ def parse_rdf(rdf_path):
         mentions (dict): dictionary with mentions and their IDs: [(start_offset, end_offset): "id"]
     """
     mentions = {}
-    tree = etree.parse(rdf_path)
-    root = tree.getroot()
-    # AuxAnnotations
-    for aux_annotation in root[-1].getchildren():
-        # Aux:InstanceAnnotations
-        for instance_annotation in aux_annotation.getchildren():
-            mention_id = instance_annotation.attrib.values()[0]
-            for child in instance_annotation.getchildren():
-                if "annotation_start" in child.tag:
-                    mention_start = child.text
-                if "annotation_end" in child.tag:
-                    mention_end = child.text
-                if "instance" in child.tag:
-                    chain_id = child.attrib.values()[0]
-            if chain_id not in mentions:
-                mentions[chain_id] = []
-            mentions[chain_id].append((mention_start, mention_end, mention_id))
+    for chain_id, mention_start, mention_end, mention_id in iter_mentions(rdf_path):
+        if chain_id not in mentions:
+            mentions[chain_id] = []
+        mentions[chain_id].append((str(mention_start), str(mention_end), mention_id))
     return mentions
 
 
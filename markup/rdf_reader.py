@@ -0,0 +1,53 @@
+from lxml import etree
+
+
+def mention_record(instance_annotation):
+    """
+    Extracts information on a mention from an instance annotation element.
+
+    Args:
+        instance_annotation (lxml.etree._Element): Aux:InstanceAnnotation element
+    Returns:
+        record (tuple or None): (chain_id (str), start (int), end (int), mention_id (str)),
+            none if the element is not a mention annotation
+    """
+    mention_start = mention_end = chain_id = None
+    for child in instance_annotation:
+        if "annotation_start" in child.tag:
+            mention_start = child.text
+        if "annotation_end" in child.tag:
+            mention_end = child.text
+        if "instance" in child.tag:
+            chain_id = child.attrib.values()[0]
+    if mention_start is None or mention_end is None or chain_id is None:
+        return None
+    mention_id = instance_annotation.attrib.values()[0]
+    return chain_id, int(mention_start), int(mention_end), mention_id
+
+
+def iter_mentions(rdf_path):
+    """
+    Reads mentions from an RDF file one by one. The XML is parsed incrementally and
+    processed elements are removed, so the whole tree is never kept in memory.
+
+    Args:
+        rdf_path (str): path to a file
+    Yields:
+        record (tuple): (chain_id (str), start (int), end (int), mention_id (str))
+    """
+    for _, element in etree.iterparse(rdf_path, events=("end",)):
+        # level: 0 — root, 1 — its children, 2 — AuxAnnotations, 3 — Aux:InstanceAnnotations
+        level = 0
+        parent = element.getparent()
+        while parent is not None:
+            level += 1
+            parent = parent.getparent()
+        if level > 3:
+            continue
+        if level == 3:
+            record = mention_record(element)
+            if record is not None:
+                yield record
+        element.clear()
+        while element.getprevious() is not None:
+            del element.getparent()[0]
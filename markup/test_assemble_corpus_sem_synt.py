@@ -0,0 +1,30 @@
+from assemble_corpus_sem_synt import align_oc_nlc, is_empty, file_state, parse_nlc
+
+
+def write(path, text):
+    with open(str(path), 'w', encoding='utf-8') as f:
+        f.write(text)
+    return str(path)
+
+
+def test_parse_nlc_keeps_negative_values(tmp_path):
+    path = write(tmp_path / 'book.csv', 'Offset=5\tParentOffset=-1\tText=мама\tSC=MOTHER(2)\n'
+                                        'Offset=0\tText=и\tSP=Conj(3)\n')
+    table = parse_nlc(path)
+    assert table['offset'].tolist() == [0, 5]
+    ready_info, missing = align_oc_nlc({0: ['и', [0]], 2: ['мама', [5, 9]]}, table)
+    assert ready_info == ['0\tи\tNA\tNA\t3', '2\tмама\t-1\t2\tNA']
+    assert missing == [9]
+
+
+def test_parse_nlc_repeated_offset(tmp_path):
+    path = write(tmp_path / 'book.csv', 'Offset=1\tSC=A(1)\nOffset=1\tSC=B(2)\n')
+    assert parse_nlc(path)['semantic_class'].tolist() == [2]
+
+
+def test_empty_nlc_file(tmp_path):
+    nlc_path = write(tmp_path / 'book.csv', 'ab')
+    align_path = write(tmp_path / 'book.txt', 'мама\t2\t5\n')
+    assert len(parse_nlc(nlc_path)['offset']) == 0
+    assert align_oc_nlc({2: ['мама', [5]]}, parse_nlc(nlc_path)) == ([], [5])
+    assert is_empty(align_path, nlc_path, [file_state(align_path), file_state(nlc_path)])
@@ -0,0 +1,97 @@
+from collections import OrderedDict
+import os
+
+
+DEFAULT_PATH = os.path.dirname(os.path.abspath(__file__)) + os.sep + 'morph_cache.tsv'
+
+_analyzer = None
+_caches = {}
+
+
+def analyzer():
+    """
+    Gives a morphological analyzer, which is created only once per process
+    (loading pymorphy2 dictionaries is expensive).
+
+    Args:
+        none
+    Returns:
+        morph (pymorphy2.MorphAnalyzer) — morphological analyzer
+    """
+    global _analyzer
+    if _analyzer is None:
+        from pymorphy2 import MorphAnalyzer
+        _analyzer = MorphAnalyzer()
+    return _analyzer
+
+
+class MorphCache:
+    """
+    Remembers parses of wordforms: wordform -> (lemma, tag). Keeps no more than maxsize
+    recently used wordforms and can be saved to a file to be used in the next runs.
+    """
+    def __init__(self, path=None, maxsize=500000):
+        self.path = path
+        self.maxsize = maxsize
+        self.cache = OrderedDict()
+        self.morph = analyzer()
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def parse(self, wordform):
+        """
+        Gives lemma and morphological tag of the most probable parse of the wordform.
+
+        Args:
+            wordform (str) — wordform to be parsed
+        Returns:
+            lemma (str), tag (str) — normal form and OpenCorpora tag of the wordform
+        """
+        if wordform in self.cache:
+            self.cache.move_to_end(wordform)
+            return self.cache[wordform]
+        parse = self.morph.parse(wordform)[0]
+        result = (parse.normal_form, str(parse.tag))
+        self.cache[wordform] = result
+        if len(self.cache) > self.maxsize:
+            self.cache.popitem(last=False)
+        return result
+
+    def load(self):
+        """
+        Reads parses saved by save(): wordform, lemma and tag per line, separated by tabs.
+        """
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                items = line.rstrip('\n').split('\t')
+                if len(items) == 3:
+                    self.cache[items[0]] = (items[1], items[2])
+        while len(self.cache) > self.maxsize:
+            self.cache.popitem(last=False)
+
+    def save(self):
+        """
+        Saves parses to the file; the file is replaced only after it's written completely.
+        """
+        if self.path is None:
+            return
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for wordform, (lemma, tag) in self.cache.items():
+                if '\t' not in wordform and '\n' not in wordform:
+                    f.write('{0}\t{1}\t{2}\n'.format(wordform, lemma, tag))
+        os.replace(tmp_path, self.path)
+
+
+def morph_cache(path=DEFAULT_PATH):
+    """
+    Gives the cache of parses shared by all the code in the process.
+
+    Args:
+        path (str or None) — path to the file with saved parses; if none, nothing is saved
+    Returns:
+        cache (MorphCache) — cache of parses
+    """
+    if path not in _caches:
+        _caches[path] = MorphCache(path)
+    return _caches[path]
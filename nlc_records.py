@@ -0,0 +1,79 @@
+import re
+
+
+reg_id = re.compile(r'\((-?[0-9]+)\)')
+reg_number = re.compile(r'-?[0-9]+')
+
+# record field: NLC feature
+NLC_FEATURES = {
+    'offset': 'Offset',
+    'parent_offset': 'ParentOffset',
+    'wordform': 'Text',
+    'semantic_class': 'SC',
+    'semantic_slot': 'SemSlot',
+    'surface_slot': 'SurfSlot',
+    'syntax_paradigm': 'SP',
+}
+
+# fields kept as they are; IDs are extracted from all the others
+TEXT_FIELDS = {'wordform'}
+
+
+def parse_fields(line):
+    """
+    Splits a line with NLC / ABBYY Compreno annotation into features, only once.
+
+    Args:
+        line (str) — annotation of a token: 'Feature=value' fields separated with tabs
+    Returns:
+        fields (dict) — {feature (str): value (str)}
+    """
+    fields = {}
+    for field in line.strip('\r\n').split('\t'):
+        feature, sep, value = field.partition('=')
+        if sep:
+            fields[feature] = value
+    return fields
+
+
+def value_id(value, default='0'):
+    """
+    Gives an ID of a value: 'Name(123)' -> '123', a number (e.g. -1, the parent offset of the root)
+    stays as it is.
+
+    Args:
+        value (str) — value of a feature
+        default (str) — what to return if there is no ID in the value
+    Returns:
+        id (str) — value ID
+    """
+    if reg_number.fullmatch(value):
+        return value
+    found = reg_id.search(value)
+    if found:
+        return found.group(1)
+    return default
+
+
+def parse_record(line, default='0'):
+    """
+    Parses a line with NLC / ABBYY Compreno annotation into a record: the wordform is kept as it is,
+    numeric IDs are extracted from all the other features.
+
+    Args:
+        line (str) — annotation of a token
+        default (str) — value of the features which are absent or have no ID
+    Returns:
+        record (dict) — {field (str): value (str)}, fields are listed in NLC_FEATURES
+    """
+    fields = parse_fields(line)
+    record = {}
+    for field in NLC_FEATURES:
+        value = fields.get(NLC_FEATURES[field])
+        if value is None:
+            record[field] = default
+        elif field in TEXT_FIELDS:
+            record[field] = value
+        else:
+            record[field] = value_id(value, default)
+    return record
@@ -1,39 +1,207 @@
+import argparse
 from bs4 import BeautifulSoup
 from bs4 import SoupStrainer
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import hashlib
+from itertools import dropwhile
+import lxml.html
 import requests
 import re
+import threading
+import time
 import unicodedata
 import os
 
 
-def texts(url):
+BOOK_URL = 'http://opencorpora.org/books.php?book_id={}&full=1'
+CACHE_FOLDER = '..' + os.sep + '!data' + os.sep + 'opencorpora_html'
+
+reg_paragraph = re.compile(r'[0-9]+? [0-9]+?\.')
+reg_sentence_number = re.compile(r'\.?[0-9]+?\.')
+reg_spaces = re.compile(' +')
+
+ASCII_SPACES = ' \n\t\x0c\r'
+PRESERVE_WHITESPACE = {'pre', 'textarea'}
+# BeautifulSoup's get_text() leaves out text of these elements
+SKIPPED_ELEMENTS = {'script', 'style', 'template'}
+
+_local = threading.local()
+
+
+class HtmlCache:
     '''
-        FUNCTION texts(url): returns a text via url
-        TAKES: url (str)
-        RETURNS: clean_text(str), new line = new paragraph
+        CLASS HtmlCache: raw pages on disk, so that they're downloaded only once
+        Pages are saved under the hash of their content, index.tsv maps URLs to hashes.
+    '''
+    def __init__(self, folder):
+        self.folder = folder
+        self.index_path = folder + os.sep + 'index.tsv'
+        self.lock = threading.Lock()
+        self.index = {}
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r', encoding='utf-8') as f_index:
+                for line in f_index:
+                    items = line.rstrip('\n').split('\t')
+                    if len(items) == 2:
+                        self.index[items[0]] = items[1]
+
+    def page_path(self, digest):
+        return self.folder + os.sep + digest + '.html'
+
+    def get(self, url):
+        '''
+            FUNCTION get(url): returns a saved page or None
+        '''
+        digest = self.index.get(url)
+        if digest is None or not os.path.exists(self.page_path(digest)):
+            return None
+        with open(self.page_path(digest), 'r', encoding='utf-8') as f_page:
+            return f_page.read()
+
+    def put(self, url, html):
+        '''
+            FUNCTION put(url, html): saves a page; the page is written to a temporary file first,
+            so an interrupted run leaves no broken pages
+        '''
+        digest = hashlib.sha256(html.encode('utf-8')).hexdigest()
+        path = self.page_path(digest)
+        if not os.path.exists(path):
+            tmp_path = '{0}.{1}.tmp'.format(path, threading.get_ident())
+            with open(tmp_path, 'w', encoding='utf-8') as f_page:
+                f_page.write(html)
+            os.replace(tmp_path, path)
+        with self.lock:
+            self.index[url] = digest
+            with open(self.index_path, 'a', encoding='utf-8') as f_index:
+                f_index.write('{0}\t{1}\n'.format(url, digest))
+
+
+def session():
+    # requests sessions are not shared between threads
+    if not hasattr(_local, 'session'):
+        _local.session = requests.Session()
+    return _local.session
+
+
+def transient(error):
+    # connection errors, timeouts and server errors may pass, client errors (e.g. 404) won't
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    return isinstance(error, requests.HTTPError) and error.response is not None and error.response.status_code >= 500
+
+
+def fetch(url, timeout=30, retries=3, backoff=1.0):
+    '''
+        FUNCTION fetch(url): downloads a page, requests failed because of connection errors, timeouts
+        or server errors (5xx) are retried with exponentially growing pauses, other errors are raised at once
+        TAKES: url (str), timeout (float, seconds), retries (int), backoff (float, first pause in seconds)
+        RETURNS: html (str)
+    '''
+    for attempt in range(retries + 1):
+        try:
+            response = session().get(url, timeout=timeout)
+            response.raise_for_status()
+            return response.text
+        except requests.RequestException as error:
+            if attempt == retries or not transient(error):
+                raise
+            time.sleep(backoff * 2 ** attempt)
+
+
+def fetch_cached(url, cache, timeout=30, retries=3, backoff=1.0):
+    html = cache.get(url)
+    if html is None:
+        html = fetch(url, timeout, retries, backoff)
+        cache.put(url, html)
+    return html
+
+
+def fetch_all(urls, cache, workers=8, timeout=30, retries=3, backoff=1.0):
     '''
-    #! settings
-    clean_text = ''
+        FUNCTION fetch_all(urls, cache): downloads pages in several threads, no more than workers at once;
+        pages from the cache aren't downloaded again
+        TAKES: urls (list of strs), cache (HtmlCache), workers (int), timeout, retries, backoff — see fetch()
+        YIELDS: url (str), html (str or None), error (Exception or None) — in order of completion
+    '''
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(fetch_cached, url, cache, timeout, retries, backoff): url for url in urls}
+        for future in as_completed(futures):
+            url = futures[future]
+            try:
+                yield url, future.result(), None
+            except requests.RequestException as error:
+                yield url, None, error
+
+
+def collapse(string, preserve=False):
+    # whitespace-only strings become a single space or newline, as in BeautifulSoup
+    if preserve or string.strip(ASCII_SPACES) != '':
+        return string
+    return '\n' if '\n' in string else ' '
+
+
+def element_strings(element, preserve=False):
+    '''
+        FUNCTION element_strings(element): yields strings of an lxml element in document order,
+        comments, scripts and styles are skipped
+    '''
+    preserve = preserve or element.tag in PRESERVE_WHITESPACE
+    if element.text:
+        yield collapse(element.text, preserve)
+    for child in element:
+        if isinstance(child.tag, str) and child.tag not in SKIPPED_ELEMENTS:
+            yield from element_strings(child, preserve)
+        if child.tail:
+            yield collapse(child.tail, preserve)
+
+
+def page_text(html, parser='html.parser'):
+    '''
+        FUNCTION page_text(html): returns text of all <tr></tr> of a page
+        TAKES: html (str), parser (str): 'html.parser' (BeautifulSoup) or 'lxml' (lxml.html, faster)
+        RETURNS: text (str)
+    '''
+    if parser == 'lxml':
+        # lxml can't parse an empty document, BeautifulSoup gives no text for it
+        if html.strip() == '':
+            return ''
+        root = lxml.html.fromstring(html)
+        # nested rows are already in the text of the outer ones, rows of templates aren't text
+        rows = [row for row in root.iter('tr')
+                if not any(parent.tag == 'tr' or parent.tag in SKIPPED_ELEMENTS for parent in row.iterancestors())]
+        return ''.join(string for row in rows for string in element_strings(row))
     # text only in <tr></tr>
     texts_tag = SoupStrainer('tr')
-    #! get only text
-    response = requests.get(url)
-    text = BeautifulSoup(response.text, 'html.parser', parse_only=texts_tag).get_text()
-    #! work with text
+    return BeautifulSoup(html, parser, parse_only=texts_tag).get_text()
+
+
+def paragraphs(text):
+    '''
+        FUNCTION paragraphs(text): yields clean paragraphs one by one
+        TAKES: text (str), text of a page
+        YIELDS: paragraph (str)
+    '''
     # remove non-stretching spaces
-    newline_for_paragraph = unicodedata.normalize('NFKD', text)
+    text = unicodedata.normalize('NFKD', text)
     # split into paragraphs
-    lines_into_paragraphs = re.sub('[0-9]+? [0-9]+?\.', '\n', newline_for_paragraph)
-    original_texts = [line for line in lines_into_paragraphs.split('\n') if line != '']
-    # get rid of sentence numbers
-    for par in original_texts:
-        text = (re.sub('\.?[0-9]+?\.', '', par)).strip(' ')
-        text = re.sub(' +', ' ', text)
-        if clean_text != '':
-            clean_text = clean_text + '\n' + text
-        else:
-            clean_text = text
-    return clean_text
+    for part in reg_paragraph.split(text):
+        for par in part.split('\n'):
+            if par != '':
+                # get rid of sentence numbers
+                par = reg_sentence_number.sub('', par).strip(' ')
+                yield reg_spaces.sub(' ', par)
+
+
+def texts(html, parser='html.parser'):
+    '''
+        FUNCTION texts(html): returns a text from a book page
+        TAKES: html (str), page of a book; parser (str), see page_text()
+        RETURNS: clean_text(str), new line = new paragraph
+    '''
+    # empty paragraphs before the first non-empty one are skipped
+    return '\n'.join(dropwhile(lambda par: par == '', paragraphs(page_text(html, parser))))
 
 
 def save_text(text, text_id):
@@ -45,25 +213,44 @@ def save_text(text, text_id):
         f_text.write(text)
 
 
-def main():
+def book_url(text_id, base_url=BOOK_URL):
+    return base_url.format(text_id)
+
+
+def main(base_url=BOOK_URL, workers=8, timeout=30, retries=3, cache_folder=CACHE_FOLDER, parser='html.parser'):
     text_ids = []
     with open('..' + os.sep + '!data' + os.sep + 'opencorpora_text_ids.csv', 'r', encoding='utf-8') as f_ids:
         for line in f_ids.readlines():
             items = line.split(';')
             if 'папка' not in line:
                 text_ids.append(int(items[0]))
+    urls = {book_url(text_id, base_url): text_id for text_id in text_ids}
+    cache = HtmlCache(cache_folder)
     i = 0
-    for text_id in text_ids:
-        url = 'http://opencorpora.org/books.php?book_id={}&full=1'.format(text_id)
-        try:
-            par = texts(url)
-            save_text(par, text_id)
-            i += 1
-            percentage = i/len(text_ids)*100
-            print('{0:.2f}%, text id: {1}'.format(percentage, text_id))
-        except:
-            print('error: {}'.format(text_id))
+    failed = []
+    for url, html, error in fetch_all(list(urls), cache, workers=workers, timeout=timeout, retries=retries):
+        text_id = urls[url]
+        if error is not None:
+            failed.append(text_id)
+            print('error: {0}, {1}'.format(text_id, error))
+            continue
+        par = texts(html, parser)
+        save_text(par, text_id)
+        i += 1
+        percentage = i/len(text_ids)*100
+        print('{0:.2f}%, text id: {1}'.format(percentage, text_id))
+    if failed:
+        print('failed: {}'.format(', '.join(str(text_id) for text_id in sorted(failed))))
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default=BOOK_URL, help='book page URL, {} is replaced with book ID')
+    parser.add_argument('--workers', type=int, default=8, help='number of simultaneous downloads')
+    parser.add_argument('--timeout', type=float, default=30, help='request timeout, seconds')
+    parser.add_argument('--retries', type=int, default=3, help='number of retries of a failed request')
+    parser.add_argument('--cache', default=CACHE_FOLDER, help='folder for downloaded pages')
+    parser.add_argument('--parser', default='html.parser', choices=['html.parser', 'lxml'], help='HTML parser')
+    args = parser.parse_args()
+    main(base_url=args.url, workers=args.workers, timeout=args.timeout, retries=args.retries, cache_folder=args.cache,
+         parser=args.parser)
@@ -1,7 +1,18 @@
+import argparse
+import json
+from functools import partial
+from multiprocessing import Pool
 import os
 import re
 import string
+import sys
 import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from atomic_writer import AtomicWriter
+
+
+# kept next to the alignment folder, which is read by markup/assemble_corpus_sem_synt.py
+MANIFEST_NAME = "align_manifest.json"
 
 
 def rename_nlc(path):
@@ -75,6 +86,11 @@ def offsets_NLC(file):
 def merge(NLC_tokens, NLC_offsets, OC_tokens, OC_offsets):
     """
     Merges two markups, of OpenCorpora and of ABBYY NLC, so that NLC tokens are aligned to OpenCorpora's (OC).
+    Both lists of offsets are sorted, so they're walked through only once, side by side.
+
+    An OC token is aligned if there is an NLC token starting at the same offset; all the following
+    NLC tokens which start before the next OC token (or, for the last OC token, inside it) are aligned
+    to it too, e.g. when NLC splits a token in two. Punctuation is not aligned.
 
     Args:
         NLC_tokens (list): list of NLC tokens in the given text
@@ -83,46 +99,115 @@ def merge(NLC_tokens, NLC_offsets, OC_tokens, OC_offsets):
         OC_offsets (list): list of starting offsets for the correpsonding tokens
     Returns:
         alignment (list of tuples): list where each tuple stands for token alignment, formatted as follows:
-            (token in OC (str), offset in OC (int), token in NLC (str), offset in NLC (int))
-
-    TODO:
-    починить костыль с str() для случаев, когда 1 токену OC соответствует два в NLC
+            (token in OC (str), offset in OC (int), tokens in NLC (list of strs), offsets in NLC (list of ints))
     """
     alignment = []
-    for OC_offset in OC_offsets:
-        ind_OC = OC_offsets.index(OC_offset)
-        if (OC_offset in NLC_offsets) and (OC_tokens[ind_OC] not in string.punctuation):
-            ind_NLC = NLC_offsets.index(OC_offset)
-            NLC_tok = NLC_tokens[ind_NLC]
-            NLC_off = NLC_offsets[ind_NLC]
-            if (ind_NLC <= len(NLC_tokens)-2) and (ind_OC <= len(OC_tokens)-2):
-                if NLC_offsets[ind_NLC + 1] < OC_offsets[ind_OC + 1]:
-                    tok = [NLC_tokens[ind_NLC], NLC_tokens[ind_NLC+1]]
-                    off = [str(NLC_offsets[ind_NLC]), str(NLC_offsets[ind_NLC+1])]
-                    NLC_tok = ", ".join(tok)
-                    NLC_off = ", ".join(off)
-            tup = (OC_tokens[ind_OC], OC_offsets[ind_OC], NLC_tok, NLC_off)
+    ind_NLC = 0
+    for ind_OC in range(len(OC_offsets)):
+        OC_offset = OC_offsets[ind_OC]
+        while ind_NLC < len(NLC_offsets) and NLC_offsets[ind_NLC] < OC_offset:
+            ind_NLC += 1
+        if ind_NLC == len(NLC_offsets):
+            break
+        if (NLC_offsets[ind_NLC] == OC_offset) and (OC_tokens[ind_OC] not in string.punctuation):
+            if ind_OC < len(OC_offsets) - 1:
+                OC_end = OC_offsets[ind_OC + 1]
+            else:
+                OC_end = OC_offset + len(OC_tokens[ind_OC])
+            ind_end = ind_NLC + 1
+            while ind_end < len(NLC_offsets) and NLC_offsets[ind_end] < OC_end:
+                ind_end += 1
+            tup = (OC_tokens[ind_OC], OC_offset, NLC_tokens[ind_NLC:ind_end], NLC_offsets[ind_NLC:ind_end])
             alignment.append(tup)
-    # alignment = alignment.sort(key=lambda line: line[1])
     return alignment
 
 
 def save_merged(alignment, path):
     """
-    Saves the alignment
+    Saves the alignment; the file is replaced only when it's written completely.
+
     Args:
-        alignment (list of tuples): list where each tuple stands for token alignment, formatted as follows:
-            (token in OC (str), offset in OC (int), token in NLC (str), offset in NLC (int))
+        alignment (list of tuples): list where each tuple stands for token alignment, see merge()
         path (str): path to save at
     Returns:
         none
     """
-    with open(path, "w", encoding="utf-8") as save_map:
+    with AtomicWriter(path) as save_map:
         for piece in alignment:
-            save_map.write("{}\t{}\t{}\n".format(piece[0], piece[1], piece[3]))
+            NLC_offsets = ", ".join(str(offset) for offset in piece[3])
+            save_map.write("{}\t{}\t{}\n".format(piece[0], piece[1], NLC_offsets))
+
+
+def input_state(paths):
+    """
+    Describes input files, so that changed inputs can be noticed.
+
+    Args:
+        paths (list of strs): paths to files
+    Returns:
+        state (list): [modification time (float), size (int)] of every file
+    """
+    state = []
+    for path in paths:
+        stat = os.stat(path)
+        state.extend([stat.st_mtime, stat.st_size])
+    return state
+
+
+def read_manifest(path):
+    """
+    Reads states of inputs of already aligned books.
+
+    Args:
+        path (str): path to the manifest
+    Returns:
+        manifest (dict): {NLC file name (str): state (list), see input_state()}
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, path):
+    with AtomicWriter(path) as f:
+        f.write(json.dumps(manifest, ensure_ascii=False, indent=1, sort_keys=True))
+
+
+def book_paths(NLC_file, path_NLC, path_OC, path_align):
+    NLC_path = path_NLC + os.sep + NLC_file
+    OC_path = path_OC + os.sep + re.sub("csv", "tokens", NLC_file)
+    file_align = path_align + os.sep + re.sub("csv", "txt", NLC_file)
+    return NLC_path, OC_path, file_align
+
+
+def align_book(NLC_file, path_NLC, path_OC, path_align):
+    """
+    Aligns tokens of a single book and saves the alignment.
+
+    Args:
+        NLC_file (str): name of the file with NLC tokenization
+        path_NLC, path_OC, path_align (str): folders with NLC and OC tokenizations and alignments
+    Returns:
+        NLC_file (str): name of the file
+        state (list): state of the inputs, see input_state()
+        tokens (int): number of NLC and OC tokens
+        aligned (int): number of aligned OC tokens
+        seconds (float): time of alignment
+    """
+    begin = time.time()
+    NLC_path, OC_path, file_align = book_paths(NLC_file, path_NLC, path_OC, path_align)
+    state = input_state([NLC_path, OC_path])
+    # tokens from both files
+    NLC_tokens, NLC_offsets = offsets_NLC(NLC_path)
+    OC_tokens, OC_offsets = offsets_opencorpora(OC_path)
+    # merge and save
+    align = merge(NLC_tokens, NLC_offsets, OC_tokens, OC_offsets)
+    save_merged(align, file_align)
+    return NLC_file, state, len(NLC_tokens) + len(OC_tokens), len(align), time.time() - begin
 
 
-def main():
+def main(workers=1, force=False, slowest=10):
     path_NLC = ".." + os.sep + "!data" + os.sep + "newcorpus" + os.sep + "nospaces_NLC"
     path_OC = ".." + os.sep + "!data" + os.sep + "newcorpus" + os.sep + "newtokens_OC"
     path_align = ".." + os.sep + "!data" + os.sep + "newcorpus" + os.sep + "align"
@@ -130,26 +215,57 @@ def main():
         os.makedirs(path_align)
     # uncomment following if it's the first code run; otherwise does nothing
     # rename_nlc(path_NLC)
-    NLC_files = [file for file in os.listdir(path_NLC) if file.endswith(".csv")]
+    NLC_files = sorted(file for file in os.listdir(path_NLC) if file.endswith(".csv"))
+    manifest_path = os.path.dirname(path_align) + os.sep + MANIFEST_NAME
+    manifest = {} if force else read_manifest(manifest_path)
+    # books whose inputs haven't changed since the last alignment are skipped
+    todo = []
+    for NLC_file in NLC_files:
+        NLC_path, OC_path, file_align = book_paths(NLC_file, path_NLC, path_OC, path_align)
+        if not (os.path.exists(file_align) and manifest.get(NLC_file) == input_state([NLC_path, OC_path])):
+            todo.append(NLC_file)
+    print("{} files, {} unchanged, {} to align".format(len(NLC_files), len(NLC_files) - len(todo), len(todo)))
+
     counter = 1
-    total = len(NLC_files)
+    total = len(todo)
+    timings = []
     begin = time.time()
-    for NLC_file in NLC_files:
-        # tokens from both files
-        NLC_tokens, NLC_offsets = offsets_NLC(path_NLC + os.sep + NLC_file)
-        OC_path = path_OC + os.sep + re.sub("csv", "tokens", NLC_file)
-        OC_tokens, OC_offsets = offsets_opencorpora(OC_path)
-        # merge and save
-        align = merge(NLC_tokens, NLC_offsets, OC_tokens, OC_offsets)
-        file_align = path_align + os.sep + re.sub("csv", "txt", NLC_file)
-        save_merged(align, file_align)
-        # logging print
-        print("{}/{} files, name: {}, ready: {:.2f}%".format(counter, total, NLC_file, counter/total*100))
-        counter += 1
+    align = partial(align_book, path_NLC=path_NLC, path_OC=path_OC, path_align=path_align)
+    if workers > 1:
+        pool = Pool(workers)
+        done = pool.imap_unordered(align, todo)
+    else:
+        done = map(align, todo)
+    try:
+        for NLC_file, state, tokens, aligned, seconds in done:
+            manifest[NLC_file] = state
+            timings.append((seconds, tokens, NLC_file))
+            # logging print
+            print("{}/{} files, name: {}, tokens: {}, aligned: {}, time: {:.2f} s, ready: {:.2f}%".format(
+                counter, total, NLC_file, tokens, aligned, seconds, counter/total*100))
+            counter += 1
+    finally:
+        if workers > 1:
+            pool.terminate()
+        # books aligned before an interruption aren't aligned again
+        save_manifest(manifest, manifest_path)
     end = time.time()
+
     print("Started at {}, ended at {}, time consumed: {}".format(time.ctime(begin),
         time.ctime(end), end-begin))
+    if timings:
+        total_tokens = sum(timing[1] for timing in timings)
+        print("{} tokens, {:.0f} tokens/sec, {:.0f} tokens/sec per worker".format(total_tokens,
+            total_tokens / max(end - begin, 1e-9), total_tokens / max(sum(timing[0] for timing in timings), 1e-9)))
+        print("Slowest books:")
+        for seconds, tokens, NLC_file in sorted(timings, reverse=True)[:slowest]:
+            print("{}\t{} tokens\t{:.2f} s".format(NLC_file, tokens, seconds))
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=1, help="number of worker processes")
+    parser.add_argument("--force", action="store_true", help="align all the books, even unchanged ones")
+    parser.add_argument("--slowest", type=int, default=10, help="number of the slowest books to report")
+    args = parser.parse_args()
+    main(workers=args.workers, force=args.force, slowest=args.slowest)
@@ -0,0 +1,125 @@
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import random
+import socket
+import threading
+import time
+import pytest
+import requests
+from get_texts_opencorpora import HtmlCache, fetch, fetch_all, texts
+
+
+WORDS = ['Слово', 'текст&nbsp;тут', 'a&amp;b', '«кавычки»', '12.', '3 4.', '  ', '\n', '\t\n ', '<b>жирный</b>',
+         'конец.', '<!-- c -->', '<i> </i>', '<pre> 1 \n 2 </pre>', '<br>', '<script>var a=1;</script>',
+         '<style>p{}</style>', '<template><table><tr><td>t</td></tr></table></template>']
+
+
+def generated_page(rng):
+    rows = []
+    for paragraph in range(rng.randint(0, 6)):
+        for sentence in range(rng.randint(1, 4)):
+            words = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(0, 8)))
+            rows.append('<tr><td>{0} {1}.</td><td>{2}</td></tr>{3}'.format(paragraph + 1, sentence + 1, words,
+                                                                            rng.choice(['\n', '', ' '])))
+    return '<html><head><title>t 1 1.</title></head><body><p>outside</p><table>{}</table></body></html>'.format(
+        ''.join(rows))
+
+
+def test_cleaning():
+    page = '<table><tr><td>1 1.</td><td>Первое  предложение.</td></tr><tr><td>1 2.</td><td>Второе.</td></tr>' \
+           '<tr><td>2 1.</td><td>Третье предложение.</td></tr></table>'
+    assert texts(page) == 'Первое предложение.\nВторое.\nТретье предложение.'
+
+
+@pytest.mark.parametrize('html', ['', '   \n'])
+def test_empty_page(html):
+    assert texts(html) == ''
+    assert texts(html, 'lxml') == ''
+
+
+def test_parsers_give_same_text():
+    rng = random.Random(0)
+    for _ in range(2000):
+        page = generated_page(rng)
+        assert texts(page, 'lxml') == texts(page)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # /ok answers at once, /flaky fails twice with 500 first, /error always fails with 500,
+    # /missing is 404, /slow answers after a pause
+    hits = Counter()
+
+    def do_GET(self):
+        self.hits[self.path] += 1
+        if self.path == '/flaky' and self.hits[self.path] <= 2 or self.path == '/error':
+            self.send_error(500)
+        elif self.path == '/missing':
+            self.send_error(404)
+        else:
+            if self.path == '/slow':
+                time.sleep(0.5)
+            body = 'page {}'.format(self.path).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    StubHandler.hits.clear()
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    httpd.daemon_threads = True
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:{}'.format(httpd.server_address[1])
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_fetch_retries_server_errors(server):
+    assert fetch(server + '/flaky', retries=3, backoff=0) == 'page /flaky'
+    assert StubHandler.hits['/flaky'] == 3
+    with pytest.raises(requests.HTTPError):
+        fetch(server + '/error', retries=2, backoff=0)
+    assert StubHandler.hits['/error'] == 3
+
+
+def test_fetch_does_not_retry_client_errors(server):
+    with pytest.raises(requests.HTTPError):
+        fetch(server + '/missing', retries=3, backoff=0)
+    assert StubHandler.hits['/missing'] == 1
+
+
+def test_fetch_retries_timeouts(server):
+    with pytest.raises(requests.Timeout):
+        fetch(server + '/slow', timeout=0.1, retries=1, backoff=0)
+    assert StubHandler.hits['/slow'] == 2
+    assert fetch(server + '/slow', timeout=5, retries=0) == 'page /slow'
+
+
+def test_fetch_retries_connection_errors():
+    with socket.socket() as free:
+        free.bind(('127.0.0.1', 0))
+        port = free.getsockname()[1]
+    with pytest.raises(requests.ConnectionError):
+        fetch('http://127.0.0.1:{}/ok'.format(port), retries=1, backoff=0)
+
+
+def test_fetch_all_cache(server, tmp_path):
+    urls = [server + path for path in ['/ok', '/flaky', '/missing']]
+    results = {url: (html, error) for url, html, error in fetch_all(urls, HtmlCache(str(tmp_path)), workers=3,
+                                                                     backoff=0)}
+    assert results[server + '/ok'] == ('page /ok', None)
+    assert results[server + '/flaky'] == ('page /flaky', None)
+    assert isinstance(results[server + '/missing'][1], requests.HTTPError)
+    hits = Counter(StubHandler.hits)
+    # downloaded pages are taken from the cache, also by a new run
+    results = {url: html for url, html, error in fetch_all(urls, HtmlCache(str(tmp_path)), workers=3, backoff=0)}
+    assert results[server + '/ok'] == 'page /ok'
+    assert results[server + '/flaky'] == 'page /flaky'
+    assert StubHandler.hits - hits == Counter({'/missing': 1})
@@ -0,0 +1,49 @@
+from offsets import merge, save_merged
+
+
+def test_merge_one_to_one():
+    tokens = ['Мама', 'мыла', 'раму', '.']
+    offsets = [0, 5, 10, 14]
+    # punctuation is not aligned
+    assert merge(tokens, offsets, tokens, offsets) == [('Мама', 0, ['Мама'], [0]), ('мыла', 5, ['мыла'], [5]),
+                                                       ('раму', 10, ['раму'], [10])]
+
+
+def test_merge_one_to_many():
+    NLC_tokens = ['Кое', '-', 'где', 'было', 'тихо']
+    NLC_offsets = [0, 3, 4, 8, 13]
+    OC_tokens = ['Кое-где', 'было', 'тихо']
+    OC_offsets = [0, 8, 13]
+    assert merge(NLC_tokens, NLC_offsets, OC_tokens, OC_offsets) == [('Кое-где', 0, ['Кое', '-', 'где'], [0, 3, 4]),
+                                                                     ('было', 8, ['было'], [8]),
+                                                                     ('тихо', 13, ['тихо'], [13])]
+
+
+def test_merge_last_token():
+    NLC_tokens = ['Было', 'кое', '-', 'где', '!']
+    NLC_offsets = [0, 5, 8, 9, 12]
+    OC_tokens = ['Было', 'кое-где']
+    OC_offsets = [0, 5]
+    # NLC tokens inside the last OC token are aligned to it, the ones after its end are not
+    assert merge(NLC_tokens, NLC_offsets, OC_tokens, OC_offsets) == [('Было', 0, ['Было'], [0]),
+                                                                     ('кое-где', 5, ['кое', '-', 'где'], [5, 8, 9])]
+
+
+def test_merge_unmatched_offsets():
+    NLC_tokens = ['Полу', 'остров', 'а', 'б']
+    NLC_offsets = [0, 4, 11, 15]
+    OC_tokens = ['Полуостров', 'и', 'аб', 'в', 'г']
+    OC_offsets = [0, 10, 11, 14, 20]
+    # OC tokens without an NLC token at the same offset are skipped, so are OC tokens after the last NLC one
+    assert merge(NLC_tokens, NLC_offsets, OC_tokens, OC_offsets) == [('Полуостров', 0, ['Полу', 'остров'], [0, 4]),
+                                                                     ('аб', 11, ['а'], [11])]
+    assert merge([], [], OC_tokens, OC_offsets) == []
+    assert merge(NLC_tokens, NLC_offsets, [], []) == []
+
+
+def test_save_merged(tmp_path):
+    path = tmp_path / 'book_1.txt'
+    save_merged([('Кое-где', 0, ['Кое', '-', 'где'], [0, 3, 4]), ('было', 8, ['было'], [8])], str(path))
+    # NLC offsets are joined with ', ' as markup/assemble_corpus_sem_synt.py reads them
+    assert path.read_text(encoding='utf-8') == 'Кое-где\t0\t0, 3, 4\nбыло\t8\t8\n'
+    assert [item.name for item in tmp_path.iterdir()] == ['book_1.txt']
@@ -0,0 +1,15 @@
+from nlc_records import parse_record, value_id
+
+
+def test_value_id():
+    assert value_id('12') == '12'
+    assert value_id('-1') == '-1'
+    assert value_id('NOUN(7)') == '7'
+    assert value_id('-') == '0'
+    assert value_id('', default='NA') == 'NA'
+
+
+def test_parse_record():
+    record = parse_record('Offset=5\tParentOffset=-1\tText=мама\tSC=MOTHER(2)\tSP=Noun(7)\n', default='NA')
+    assert record == {'offset': '5', 'parent_offset': '-1', 'wordform': 'мама', 'semantic_class': '2',
+                      'semantic_slot': 'NA', 'surface_slot': 'NA', 'syntax_paradigm': '7'}
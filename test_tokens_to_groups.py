@@ -0,0 +1,16 @@
+from tokens_to_groups import add_group_to_tokens, tokens_to_dict
+
+
+def test_add_group_to_tokens():
+    tokens = tokens_to_dict(['0\t4\tмама', '5\t4\tмыла'])
+    add_group_to_tokens('1\t10\t100\t9\t0\t9\tмама мыла\t0,5\tattr', tokens)
+    add_group_to_tokens('1\t11\t101\t10\t0\t4\tмама\t0\tattr', tokens)
+    assert tokens[0][1:] == [['10', '11'], ['100', '101'], ['9', '10']]
+    assert tokens[5][1:] == [['10'], ['100'], ['9']]
+
+
+def test_add_group_to_tokens_empty_shifts():
+    tokens = tokens_to_dict(['0\t4\tмама'])
+    add_group_to_tokens('1\t10\t100\t9\t0\t0\t\t\tattr', tokens)
+    add_group_to_tokens('1\t11\t101\t10\t0\t4\tмама\t0, \tattr', tokens)
+    assert tokens[0][1:] == [['11'], ['101'], ['10']]
@@ -1,107 +1,133 @@
+from itertools import groupby
 import os
+from atomic_writer import AtomicWriter
 
 
-def data_to_dict(path):
-    data_dict = {}
+def read_by_doc(path):
+    """
+    Reads a RuCor file line by line and groups consecutive lines of the same document.
+    Documents have to be sorted by doc_id, each one in consecutive lines.
+
+    Args:
+        path (str) — path to the file (the first line is a header, the first column is doc_id)
+    Yields:
+        doc_id (str), data (list of strs) — lines of the document without doc_id
+    """
+    previous_doc_id = None
     with open(path, 'r', encoding='utf-8') as f_data:
-        information = [info.strip('\n') for info in f_data.readlines()[1:] if info.strip('\n') != '']
-    for info in information:
-        items = info.split('\t', maxsplit=1)
-        doc_id = items[0]
-        data = items[1]
-        if doc_id not in data_dict.keys():
-            data_dict[doc_id] = []
-        data_dict[doc_id].append(data)
-    return data_dict
-
-
-def initial_data():
-    tokens_path = '..' + os.sep + 'RuCor' + os.sep + 'Tokens.txt'
-    groups_path = '..' + os.sep + 'RuCor' + os.sep + 'Groups.txt'
-    return data_to_dict(tokens_path), data_to_dict(groups_path)
+        f_data.readline()
+        items = (line.strip('\n').split('\t', maxsplit=1) for line in f_data if line.strip('\n') != '')
+        for doc_id, doc_items in groupby(items, key=lambda doc_items: doc_items[0]):
+            # otherwise the join with the other file would silently lose lines
+            if previous_doc_id is not None and doc_order(doc_id) <= doc_order(previous_doc_id):
+                raise ValueError('{0}: documents are not sorted by doc_id or not contiguous: '
+                                 '{1} after {2}'.format(path, doc_id, previous_doc_id))
+            previous_doc_id = doc_id
+            yield doc_id, [doc_item[1] for doc_item in doc_items]
+
+
+def doc_order(doc_id):
+    # numeric ids go first, in numeric order
+    return (0, int(doc_id), '') if doc_id.isdigit() else (1, 0, doc_id)
+
+
+def join_by_doc(tokens_docs, groups_docs):
+    """
+    Joins tokens and groups of the same documents; both are sorted by doc_id, so they're
+    read side by side and only one document is kept in memory.
+
+    Args:
+        tokens_docs (iterator) — tokens by documents, see read_by_doc()
+        groups_docs (iterator) — groups by documents, see read_by_doc()
+    Yields:
+        doc_id (str), tokens (list of strs), groups (list of strs) — groups are empty
+            if the document has none
+    """
+    groups_doc_id, groups = next(groups_docs, (None, []))
+    for doc_id, tokens in tokens_docs:
+        while groups_doc_id is not None and doc_order(groups_doc_id) < doc_order(doc_id):
+            groups_doc_id, groups = next(groups_docs, (None, []))
+        if groups_doc_id == doc_id:
+            yield doc_id, tokens, groups
+        else:
+            yield doc_id, tokens, []
+    # the rest of groups is read anyway, so that their order is checked
+    for _ in groups_docs:
+        pass
 
 
 def tokens_to_dict(tokens):
+    """
+    Turns tokens of a document into records, to which groups are attached.
+
+    Args:
+        tokens (list of strs) — token lines without doc_id
+    Returns:
+        tokens_dict (dict) — {offset (int): [token_info (str), group_ids (list), chain_ids (list), link_ids (list)]}
+    """
     tokens_dict = {}
     for token in tokens:
         token_parts = token.split('\t', maxsplit=1)
-        offset = token_parts[0]
+        offset = int(token_parts[0])
         token_info = token_parts[1]
-        tokens_dict[offset] = token_info
+        tokens_dict[offset] = [token_info, [], [], []]
     return tokens_dict
 
 
-def add_group_to_tokens(group, tokens_dict, tokens_mentioned):
+def add_group_to_tokens(group, tokens_dict):
     # initial info
     group_items = group.split('\t')
     group_id = group_items[1]
     chain_id = group_items[2]
     link_id = group_items[3]
-    if ',' in group_items[7]:
-        # many tokens in a group
-        tk_shifts = group_items[7].split(',')
-    else:
-        tk_shifts = []
-        tk_shifts.append(group_items[7])
-    for offset in tk_shifts:
-        if offset in tokens_dict.keys():
-            token_info = tokens_dict[offset].split('\t')
-            # len(token_info) >= 7 — have to write new info next to old
-            if len(token_info) >= 7:
-                token_info[4] = token_info[4] + ',' + group_id
-                token_info[5] = token_info[5] + ',' + chain_id
-                token_info[6] = token_info[6] + ',' + chain_id
-                tokens_dict[offset] = '\t'.join(token_info)
-            else:
-                tokens_dict[offset] = '{0}\t{1}\t{2}\t{3}'.format(tokens_dict[offset], group_id, chain_id, link_id)
-            # remove from mentioned tokens
-            if offset in tokens_mentioned:
-                tokens_mentioned.remove(offset)
-    return tokens_dict, tokens_mentioned
-
-
-def save_tokens(tokens, doc_id, path):
-    if os.path.exists(path):
-        done_tokens_file = open(path, 'a', encoding='utf-8')
-    else:
-        # initializing with a header
-        done_tokens_file = open(path, 'w', encoding='utf-8')
-        done_tokens_file.write('doc_id\tshift\tlength\ttoken\tlemma\tgram\tgroup_id\tchain_id\tlink_id\n')
+    # one or many tokens in a group
+    for offset in group_items[7].split(','):
+        offset = offset.strip()
+        # empty parts (e.g. a group without tokens) point to no token
+        if not offset:
+            continue
+        token = tokens_dict.get(int(offset))
+        if token is not None:
+            token[1].append(group_id)
+            token[2].append(chain_id)
+            token[3].append(link_id)
+    return tokens_dict
+
+
+def token_line(doc_id, offset, token):
+    """
+    Formats a token record as a line of new_tokens.txt; tokens without groups get dashes.
+    """
+    ids = [','.join(token_ids) if token_ids else '-' for token_ids in token[1:]]
+    return '{0}\t{1}\t{2}\t{3}\t{4}\t{5}\n'.format(doc_id, offset, token[0], ids[0], ids[1], ids[2])
+
+
+def save_tokens(tokens, doc_id, done_tokens_file):
     # printing offsets in correct order
-    offsets_as_ints = [int(offset) for offset in tokens.keys()]
-    for offset in sorted(offsets_as_ints):
-        line = '{0}\t{1}\t{2}\n'.format(doc_id, offset, tokens[str(offset)])
-        done_tokens_file.write(line)
+    for offset in sorted(tokens):
+        done_tokens_file.write(token_line(doc_id, offset, tokens[offset]))
 
 
 def main():
-    # getting all the data
-    tokens_dict, groups_dict = initial_data()
+    tokens_path = '..' + os.sep + 'RuCor' + os.sep + 'Tokens.txt'
+    groups_path = '..' + os.sep + 'RuCor' + os.sep + 'Groups.txt'
     path_for_done_tokens = '..' + os.sep + 'RuCor' + os.sep + 'new_tokens.txt'
     # vars for logging
     doc_counter = 1
-    total_docs = len(tokens_dict.keys())
-    for doc_id in tokens_dict.keys():
-        # for particular document
-        tokens_in_doc = tokens_dict[doc_id]
-        groups = groups_dict[doc_id]
-        # tokens in format: {'offset': 'token_features'}
-        tokens = tokens_to_dict(tokens_in_doc)
-        # those left in tokens_mentioned have nothing in Groups, have to be filled with dashes
-        tokens_mentioned = set(tokens.keys())
-        # work with Groups
-        for group in groups:
-            tokens, tokens_mentioned = add_group_to_tokens(group, tokens, tokens_mentioned)
-        # filling with dashes
-        for offset in tokens_mentioned:
-            tokens[offset] = '{0}\t-\t-\t-'.format(tokens[offset])
-        # saving everything
-        save_tokens(tokens, doc_id, path_for_done_tokens)
-        # logging
-        percentage = doc_counter/total_docs*100
-        print('{0:.2f}%, doc id: {1}'.format(percentage, doc_id))
-        doc_counter += 1
+    with AtomicWriter(path_for_done_tokens) as done_tokens_file:
+        done_tokens_file.write('doc_id\tshift\tlength\ttoken\tlemma\tgram\tgroup_id\tchain_id\tlink_id\n')
+        # documents are read one by one from both files
+        for doc_id, tokens_in_doc, groups in join_by_doc(read_by_doc(tokens_path), read_by_doc(groups_path)):
+            tokens = tokens_to_dict(tokens_in_doc)
+            # work with Groups
+            for group in groups:
+                tokens = add_group_to_tokens(group, tokens)
+            # saving everything
+            save_tokens(tokens, doc_id, done_tokens_file)
+            # logging
+            print('{0} docs, doc id: {1}'.format(doc_counter, doc_id))
+            doc_counter += 1
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()